@@ -1,5 +1,5 @@
 import asyncio
-import re
+import time
 import aiohttp
 from typing import Dict, Any, Tuple, Optional, Callable, Awaitable, TypeVar, Union, List
 
@@ -20,6 +20,13 @@ active_response_tasks: Dict[str, asyncio.Task] = {}
 # Semaphore to limit concurrent API calls to Character.AI
 api_semaphore = asyncio.Semaphore(3)  # Allow up to 3 concurrent API calls
 
+# Seconds a get_bot_info result is reused before asking Character.AI again
+BOT_INFO_TTL = 60
+# (token, character_id) -> (info, time.monotonic() when fetched)
+_bot_info_cache: Dict[Tuple[str, str], Tuple[Dict[str, Any], float]] = {}
+# (token, character_id) -> fetch currently in progress
+_bot_info_inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+
 
 def current_token(session):
     if session["alt_token"]:
@@ -61,6 +68,9 @@ async def get_bot_info(token: Optional[str] = None,
     """
     Retrieves the bot's information (name and avatar URL) from the Character.AI service.
 
+    Results are cached for BOT_INFO_TTL seconds, and concurrent calls for the
+    same character share a single request.
+
     Args:
         token: The Character.AI API token
         character_id: The specific character ID to fetch info for
@@ -75,6 +85,26 @@ async def get_bot_info(token: Optional[str] = None,
         func.log.error("No character_id provided to get_bot_info")
         return None
 
+    key = (token, character_id)
+    cached = _bot_info_cache.get(key)
+    if cached is not None and time.monotonic() - cached[1] < BOT_INFO_TTL:
+        return dict(cached[0])
+
+    task = _bot_info_inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_fetch_bot_info(token, character_id))
+        _bot_info_inflight[key] = task
+        task.add_done_callback(lambda _: _bot_info_inflight.pop(key, None))
+    # Shield the shared task so one caller being cancelled doesn't cancel it for the others
+    info = await asyncio.shield(task)
+    if info is None:
+        return None
+    _bot_info_cache[key] = (info, time.monotonic())
+    return dict(info)
+
+
+async def _fetch_bot_info(token: str, character_id: str) -> Optional[Dict[str, Any]]:
+    """Fetches character information from Character.AI, without caching."""
     try:
         async with api_semaphore:
             client = await get_client(token)
@@ -97,6 +127,21 @@ async def get_bot_info(token: Optional[str] = None,
         return None
 
 
+async def _persist_session(session: Dict[str, Any], server_id: str, channel_id: str) -> None:
+    """
+    Queues a write of the channel that owns this AI session.
+
+    The session dict lives inside the channel's data in func.session_cache, so
+    the whole channel mapping is written rather than the single AI's session.
+    """
+    channel_data = func.get_session_data(server_id, channel_id)
+    if channel_data is None or not any(s is session for s in channel_data.values()):
+        func.log.debug(
+            "Session for channel %s is no longer cached, skipping write", channel_id)
+        return
+    await func.update_session_data(server_id, channel_id, channel_data)
+
+
 async def new_chat_id(create_new: bool, session: Dict[str, Any],
                       server_id: str, channel_id_str: str) -> Tuple[Optional[str], Optional[Any]]:
     """
@@ -135,11 +180,7 @@ async def new_chat_id(create_new: bool, session: Dict[str, Any],
 
             session["chat_id"] = chat.chat_id
             session["setup_has_already"] = False
-            # The session object itself is already a reference to the dictionary within func.session_cache.
-            # So, directly modifying 'session' will update the in-memory cache.
-            # We only need to queue the update for persistent storage.
-            # Ensure the session is a copy to avoid modifying the original object in the cache directly before it's written.
-            await func.session_update_queue.put((server_id, channel_id_str, session.copy()))
+            await _persist_session(session, server_id, channel_id_str)
 
             return chat.chat_id, greeting_message_obj
     except Exception as e:
@@ -196,9 +237,8 @@ async def initialize_session_messages(session: Dict[str, Any], server_id: str,
                 greeting_message = greeting_obj.get_primary_candidate().text
                 func.log.debug(
                     "Character greeting message for channel %s: %s", channel_id, greeting_message)
-                for pattern in session["config"].get("remove_ai_text_from", []):
-                    greeting_message = re.sub(
-                        pattern, '', greeting_message, flags=re.MULTILINE).strip()
+                for pattern in func.compile_patterns(session["config"].get("remove_ai_text_from", [])):
+                    greeting_message = pattern.sub('', greeting_message).strip()
     except Exception as e:
         func.log.critical(
             "Error during chat session initialization for channel %s: %s", channel_id, e)
@@ -214,18 +254,14 @@ async def initialize_session_messages(session: Dict[str, Any], server_id: str,
                 system_msg_reply = system_reply_obj.get_primary_candidate().text
                 func.log.debug(
                     "Character response to system prompt for channel %s: %s", channel_id, system_msg_reply)
-                for pattern in session["config"].get("remove_ai_text_from", []):
-                    system_msg_reply = re.sub(
-                        pattern, '', system_msg_reply, flags=re.MULTILINE).strip()
+                for pattern in func.compile_patterns(session["config"].get("remove_ai_text_from", [])):
+                    system_msg_reply = pattern.sub('', system_msg_reply).strip()
         except Exception as e:
             func.log.error(
                 "Error sending system message for channel %s: %s", channel_id, e)
 
     session["setup_has_already"] = True
-    # The session object itself is already a reference to the dictionary within func.session_cache.
-    # We only need to queue the update for persistent storage.
-    # Ensure the session is a copy to avoid modifying the original object in the cache directly before it's written.
-    await func.session_update_queue.put((server_id, channel_id, session.copy()))
+    await _persist_session(session, server_id, channel_id)
 
     return greeting_message, system_msg_reply
 
@@ -342,9 +378,8 @@ async def cai_response(messages: Dict[str, Any], message,
 
     finally:
         # Clean up the response by removing unwanted patterns
-        for pattern in session["config"].get("remove_ai_text_from", []):
-            AI_response = re.sub(pattern, '', AI_response,
-                                 flags=re.MULTILINE).strip()
+        for pattern in func.compile_patterns(session["config"].get("remove_ai_text_from", [])):
+            AI_response = pattern.sub('', AI_response).strip()
         try:
             if client:
                 await client.close_session()
@@ -377,7 +412,7 @@ async def process_response_queue():
 
             try:
                 # Get cached messages
-                cached_data = await asyncio.to_thread(func.read_json, "messages_cache.json") or {}
+                cached_data = func.get_message_cache()
 
                 # Get session data for this specific AI
                 # The session data is structured as {server_id: {channels: {channel_id: {ai_name: {ai_data}}}}}
@@ -4,7 +4,6 @@ import os
 from typing import Dict, Any, Optional, List
 
 import discord
-from colorama import init
 from discord.ext import commands
 
 import utils.updater as updater
@@ -14,12 +13,16 @@ from AI.cai import initialize_session_messages
 # Import webhook to access session_data and webhook_send
 import commands.ai_manager as ai_manager
 
-# Initialize colorama for colored logs
-init(autoreset=True)
-
 # For Windows compatibility with asyncio
 if platform.system() == "Windows":
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+else:
+    try:
+        # Optional: uvloop's event loop is considerably faster than the default one
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
 
 # Set up Discord intents
 intents = discord.Intents.default()
@@ -46,6 +49,10 @@ class BridgeBot(commands.Bot):
         # await self.load_extension('commands.bot')
         await self.load_extension('commands.ai_manager')
 
+        # Register every slash command with one bulk overwrite, once per process.
+        # on_ready fires again on every reconnect, so syncing there repeats the call.
+        await self.tree.sync()
+
         # Ensure session.json exists
         if not os.path.exists("session.json"):
             func.write_json("session.json", {})
@@ -61,6 +68,10 @@ class BridgeBot(commands.Bot):
         self.update_processor = asyncio.create_task(
             func.process_session_updates())
 
+        # Look for updates while the bot connects instead of before it starts
+        self.update_check = asyncio.create_task(
+            updater.check_for_updates_in_background(self))
+
         # Sync AI configurations for each webhook
         await AI.sync_config(self)
 
@@ -74,15 +85,15 @@ class BridgeBot(commands.Bot):
             except asyncio.CancelledError:
                 pass
 
-        # Ensure all pending updates are processed
-        await func.session_update_queue.join()
+        # Ensure all pending updates are written to disk
+        await func.flush_session_updates()
+        await func.flush_message_cache_async()
 
         await super().close()
 
     async def on_ready(self):
         """Bot ready event handler"""
         if not self.synced:
-            await self.tree.sync()  # Sync slash commands
             self.synced = True
             func.log.info("Logged in as %s!", self.user)
 
@@ -94,7 +105,7 @@ class BridgeBot(commands.Bot):
         func.log.info("Initializing all webhooks...")
 
         # Iterate over all sessions (each webhook) in session.json
-        for server_id, server_data in func.session_cache.items():
+        for server_id, server_data in func.get_session_cache_view().items():
             channels = server_data.get("channels", {})
             for channel_id, channel_data in channels.items():
                 # Get the channel object (if available)
@@ -188,6 +199,8 @@ async def on_message(message):
 
 # Start the bot
 if __name__ == "__main__":
+    # Startup screen, session and config migrations, and the update check
+    asyncio.run(updater.boot())
     try:
         bot.run(func.config_yaml["Discord"]["token"])
     except discord.LoginFailure:
@@ -195,4 +208,10 @@ if __name__ == "__main__":
     except Exception as e:
         func.log.critical("Fatal runtime error: %s", e)
     finally:
-        input("Press Enter to exit...")
+        if updater.pending_update is None:
+            input("Press Enter to exit...")
+    if updater.pending_update is not None:
+        # The background check closed the bot to install an update; this only returns
+        # if neither the update nor restarting the bot without it worked
+        if not updater.apply_pending_update():
+            input("Press Enter to exit...")
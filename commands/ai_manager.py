@@ -1,6 +1,7 @@
+import copy
 import time
 import asyncio
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Set, Tuple
 
 import aiohttp
 import discord
@@ -12,10 +13,96 @@ import AI.cai as cai
 
 # Note: session_data is now managed through func.session_cache
 
+# Avatar bytes are reused for this many seconds, for at most this many URLs
+AVATAR_CACHE_TTL = 600
+AVATAR_CACHE_SIZE = 64
+# Largest avatar we will download (Discord's own avatar limit is 10 MiB)
+AVATAR_MAX_BYTES = 10 * 1024 * 1024
+
+# Default per-AI configuration; setup gives each new AI its own deep copy
+_DEFAULT_AI_CONFIG = {
+    "use_cai_avatar": True,
+    "use_cai_display_name": True,
+    "new_chat_on_reset": False,
+    "system_message": """[DO NOT RESPOND TO THIS MESSAGE!]
+You are connected to a Discord channel, where several people may be present. Your objective is to interact with them in the chat.
+Greet the participants and introduce yourself by fully translating your message into English.
+Now, send your message introducing yourself in the chat, following the language of this message!""",
+    "send_the_greeting_message": True,
+    "send_the_system_message_reply": True,
+    "send_message_line_by_line": True,
+    "delay_for_generation": 5,
+    "cache_count_threshold": 5,
+    "remove_ai_text_from": [r'\*[^*]*\*', r'\[[^\]]*\]', '"'],
+    "remove_user_text_from": [r'\*[^*]*\*', r'\[[^\]]*\]'],
+    "remove_user_emoji": True,
+    "remove_ai_emoji": True,
+    "user_reply_format_syntax": """┌──[🔁 Replying to @{reply_username} - {reply_name}]
+│   ├─ 📝 Reply: {reply_message}
+│   └─ ⏳ {time} ~ @{username} - {name}
+|   └─ 📢 Message: {message}
+└───────────────────────────────────────""",
+    "user_format_syntax": """┌──[💬]
+│   ├─ ⏳ {time} ~ @{username} - {name}
+│   └─ 📢 Message: {message}
+└───────────────────────────────────────"""
+}
+
+# Shared HTTP session for avatar downloads and webhook calls, created lazily inside the running loop
+_http_session: Optional[aiohttp.ClientSession] = None
+# Webhook objects by URL, built against _http_session
+_webhooks: Dict[str, discord.Webhook] = {}
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """
+    Returns the application-wide aiohttp session, creating it on first use.
+    Reusing one session keeps connections to Discord and the avatar CDN alive between calls.
+    """
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300))
+    return _http_session
+
+
+async def close_http_session() -> None:
+    """Closes the shared aiohttp session if it is open."""
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
+    # Cached webhooks are bound to the closed session
+    _webhooks.clear()
+
+
+def get_webhook(url: str) -> discord.Webhook:
+    """
+    Returns a Webhook for the URL bound to the shared session, building it only once per URL.
+    """
+    webhook_obj = _webhooks.get(url)
+    if webhook_obj is None:
+        webhook_obj = discord.Webhook.from_url(url, session=get_http_session())
+        _webhooks[url] = webhook_obj
+    return webhook_obj
+
+
 class AIManager(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.webhook_locks: Dict[str, asyncio.Lock] = {}
+        # Channels with a webhook setup in flight; guarded by a single condition
+        self._inflight: Set[str] = set()
+        self._cv = asyncio.Condition()
+        # Downloaded avatars by URL: (bytes, monotonic fetch time)
+        self._avatar_cache: Dict[str, Tuple[bytes, float]] = {}
+
+    @property
+    def http(self) -> aiohttp.ClientSession:
+        """Shared aiohttp session used for every HTTP call made by this cog."""
+        return get_http_session()
+
+    async def cog_unload(self):
+        await close_http_session()
 
     async def ai_name_autocomplete(self, interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
         """
@@ -44,6 +131,18 @@ class AIManager(commands.Cog):
             func.log.error(f"Error in ai_name_autocomplete: {e}")
             return []
 
+    async def _acquire(self, channel_id: str) -> None:
+        """Wait until no other setup is running for the channel, then claim it."""
+        async with self._cv:
+            await self._cv.wait_for(lambda: channel_id not in self._inflight)
+            self._inflight.add(channel_id)
+
+    async def _release(self, channel_id: str) -> None:
+        """Release a channel claimed with _acquire and wake up any waiters."""
+        async with self._cv:
+            self._inflight.discard(channel_id)
+            self._cv.notify_all()
+
     def _generate_unique_ai_name(self, base_name: str, existing_names: set) -> str:
         """
         Generate a unique AI name by adding a suffix if the name already exists.
@@ -66,13 +165,35 @@ class AIManager(commands.Cog):
         return f"{base_name}_{counter}"
 
     async def _fetch_avatar(self, url: str) -> Optional[bytes]:
-        """Fetch avatar image from URL."""
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    return await response.read()
+        """Fetch avatar image from URL, reusing recently downloaded images."""
+        cached = self._avatar_cache.get(url)
+        if cached and time.monotonic() - cached[1] < AVATAR_CACHE_TTL:
+            return cached[0]
+
+        async with self.http.get(url) as response:
+            if response.status != 200:
+                return None
+            content_length = response.headers.get("Content-Length")
+            if content_length and content_length.isdigit() and int(content_length) > AVATAR_MAX_BYTES:
+                func.log.warning("Avatar at %s is too large (%s bytes), skipping", url, content_length)
                 return None
 
+            # Stream the body so an oversized response is dropped before it is fully buffered
+            buffer = bytearray()
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                buffer.extend(chunk)
+                if len(buffer) > AVATAR_MAX_BYTES:
+                    func.log.warning("Avatar at %s exceeds %d bytes, skipping", url, AVATAR_MAX_BYTES)
+                    return None
+            data = bytes(buffer)
+
+        # Evict the oldest entry (dicts keep insertion order) once the cache is full
+        self._avatar_cache.pop(url, None)
+        if len(self._avatar_cache) >= AVATAR_CACHE_SIZE:
+            del self._avatar_cache[next(iter(self._avatar_cache))]
+        self._avatar_cache[url] = (data, time.monotonic())
+        return data
+
     async def _create_webhook(self, interaction: discord.Interaction,
                               channel: discord.TextChannel,
                               character_info: Dict[str, Any]) -> Optional[str]:
@@ -116,16 +237,30 @@ class AIManager(commands.Cog):
             )
             return None
 
+    async def _send_initial_messages(self, send, greetings: Optional[str], reply_system: Optional[str],
+                                     ai_name: str, channel_id: str, via: str) -> None:
+        """
+        Sends the greeting and then the system message through the given send coroutine.
+
+        The two are sent one after the other so the greeting always appears first;
+        a failure on either is logged without stopping the other.
+        """
+        for label, text in (("Greeting", greetings), ("System", reply_system)):
+            if not text:
+                continue
+            try:
+                await send(text)
+                func.log.info("%s message sent %s for AI %s in channel %s", label, via, ai_name, channel_id)
+            except Exception as e:
+                func.log.error("Error sending %s message %s for AI %s in channel %s: %s",
+                               label.lower(), via, ai_name, channel_id, e)
+
     async def _update_bot_profile(self, guild: discord.Guild, character_info: Dict[str, Any]):
         """
         Update the bot's nickname and avatar in the server to match the selected character.
         """
         try:
-            avatar_bytes = None
-            async with aiohttp.ClientSession() as session:
-                async with session.get(character_info["avatar_url"]) as response:
-                    if response.status == 200:
-                        avatar_bytes = await response.read()
+            avatar_bytes = await self._fetch_avatar(character_info["avatar_url"])
             me = guild.me
             await me.edit(nick=character_info["name"])
             if avatar_bytes:
@@ -182,49 +317,24 @@ class AIManager(commands.Cog):
         
         ai_name = unique_ai_name
         
-        # Create new AI session
-        session = {}
-
-        config_default = {
-            "use_cai_avatar": True,
-            "use_cai_display_name": True,
-            "new_chat_on_reset": False,
-            "system_message": """[DO NOT RESPOND TO THIS MESSAGE!]
-You are connected to a Discord channel, where several people may be present. Your objective is to interact with them in the chat.
-Greet the participants and introduce yourself by fully translating your message into English.
-Now, send your message introducing yourself in the chat, following the language of this message!""",
-            "send_the_greeting_message": True,
-            "send_the_system_message_reply": True,
-            "send_message_line_by_line": True,
-            "delay_for_generation": 5,
-            "cache_count_threshold": 5,
-            "remove_ai_text_from": [r'\*[^*]*\*', r'\[[^\]]*\]', '"'],
-            "remove_user_text_from": [r'\*[^*]*\*', r'\[[^\]]*\]'],
-            "remove_user_emoji": True,
-            "remove_ai_emoji": True,
-            "user_reply_format_syntax": """┌──[🔁 Replying to @{reply_username} - {reply_name}]
-│   ├─ 📝 Reply: {reply_message}
-│   └─ ⏳ {time} ~ @{username} - {name}
-|   └─ 📢 Message: {message}
-└───────────────────────────────────────""",
-            "user_format_syntax": """┌──[💬]
-│   ├─ ⏳ {time} ~ @{username} - {name}
-│   └─ 📢 Message: {message}
-└───────────────────────────────────────"""
-        }
+        # Create new AI session state (kept apart from the shared HTTP session)
+        session_state = {}
 
         if mode.value == "webhook":
-            # Webhook setup
-            if channel_id_str not in self.webhook_locks:
-                self.webhook_locks[channel_id_str] = asyncio.Lock()
-            async with self.webhook_locks[channel_id_str]:
-                # Create webhook for this AI instance
-                WB_url = await self._create_webhook(interaction, channel, character_info)
-                if WB_url is None:
-                    func.log.error(f"Failed to create webhook for channel {channel_id_str}")
-                    return
-
-                session.update({
+            # Webhook setup. The channel is only claimed while its session data is
+            # read and written; the Discord round trips happen outside the claim.
+            WB_url = await self._create_webhook(interaction, channel, character_info)
+            if WB_url is None:
+                func.log.error(f"Failed to create webhook for channel {channel_id_str}")
+                return
+
+            await self._acquire(channel_id_str)
+            try:
+                # Re-read under the claim in case another setup added an AI meanwhile
+                channel_data = func.get_session_data(server_id, channel_id_str) or {}
+                ai_name = self._generate_unique_ai_name(ai_name, set(channel_data.keys()))
+
+                session_state.update({
                     "channel_name": channel.name,
                     "character_id": character_id,
                     "webhook_url": WB_url,
@@ -232,37 +342,54 @@ Now, send your message introducing yourself in the chat, following the language
                     "setup_has_already": False,
                     "last_message_time": time.time(),
                     "awaiting_response": False,
-                    "alt_token": session.get("alt_token"),
-                    "muted_users": session.get("muted_users", []),
-                    "config": session.get("config", config_default)
+                    "alt_token": None,
+                    "muted_users": [],
+                    "config": copy.deepcopy(_DEFAULT_AI_CONFIG)
                 })
 
                 # Add this AI to the channel's AI configurations
-                channel_data[ai_name] = session
+                channel_data[ai_name] = session_state
                 await func.update_session_data(server_id, channel_id_str, channel_data)
-                
-                greetings, reply_system = await cai.initialize_session_messages(session, server_id, channel_id_str)
-                if greetings:
-                    try:
-                        await webhook_send(WB_url, greetings, session)
-                        func.log.info("Greeting message sent via webhook for AI %s in channel %s", ai_name, channel_id_str)
-                    except Exception as e:
-                        func.log.error("Error sending greeting via webhook for AI %s in channel %s: %s", ai_name, channel_id_str, e)
-                if reply_system:
-                    try:
-                        await webhook_send(WB_url, reply_system, session)
-                        func.log.info("System message sent via webhook for AI %s in channel %s", ai_name, channel_id_str)
-                    except Exception as e:
-                        func.log.error("Error sending system message via webhook for AI %s in channel %s: %s", ai_name, channel_id_str, e)
-                
-                # Mark setup as complete
-                channel_data[ai_name]["setup_has_already"] = True
-                await func.update_session_data(server_id, channel_id_str, channel_data)
-                
+            finally:
+                await self._release(channel_id_str)
+
+            greetings, reply_system = await cai.initialize_session_messages(session_state, server_id, channel_id_str)
+            await self._send_initial_messages(
+                lambda text: webhook_send(WB_url, text, session_state),
+                greetings, reply_system, ai_name, channel_id_str, "via webhook")
+
+            # Mark setup as complete
+            await self._acquire(channel_id_str)
+            try:
+                session_state["setup_has_already"] = True
+                channel_data = func.get_session_data(server_id, channel_id_str)
+                still_configured = channel_data is not None and channel_data.get(ai_name) is session_state
+                if still_configured:
+                    await func.update_session_data(server_id, channel_id_str, channel_data)
+            finally:
+                await self._release(channel_id_str)
+
+            if not still_configured:
+                # The AI was removed (or replaced) while its greeting was being sent
+                func.log.warning(
+                    "AI %s was removed from channel %s during setup; cancelling setup", ai_name, channel_id_str)
+                try:
+                    webhook_obj = _webhooks.pop(WB_url, None) or discord.Webhook.from_url(WB_url, session=self.http)
+                    await webhook_obj.delete(reason=f"Setup of AI '{ai_name}' was cancelled")
+                except discord.NotFound:
+                    pass  # Already deleted together with the AI
+                except Exception as e:
+                    func.log.error(f"Failed to delete webhook for cancelled AI '{ai_name}': {e}")
                 await interaction.followup.send(
-                    f"Setup successful!\n**AI name:** {ai_name}\n**Character name:** {character_info['name']}\n**Character ID:** `{character_id}`\n**Channel:** {channel.mention}\n**Mode:** Webhook",
+                    f"Setup of AI '{ai_name}' was cancelled because the AI was removed from {channel.mention} while it was being set up.",
                     ephemeral=True
                 )
+                return
+
+            await interaction.followup.send(
+                f"Setup successful!\n**AI name:** {ai_name}\n**Character name:** {character_info['name']}\n**Character ID:** `{character_id}`\n**Channel:** {channel.mention}\n**Mode:** Webhook",
+                ephemeral=True
+            )
         else:
             # Bot mode setup - only allow one bot per channel
             existing_bot = None
@@ -276,38 +403,28 @@ Now, send your message introducing yourself in the chat, following the language
                 return
             
             await self._update_bot_profile(interaction.guild, character_info)
-            session.update({
+            session_state.update({
                 "channel_name": channel.name,
                 "character_id": character_id,
                 "mode": "bot",
                 "setup_has_already": False,
                 "last_message_time": time.time(),
                 "awaiting_response": False,
-                "alt_token": session.get("alt_token"),
-                "muted_users": session.get("muted_users", []),
-                "config": session.get("config", config_default)
+                "alt_token": None,
+                "muted_users": [],
+                "config": copy.deepcopy(_DEFAULT_AI_CONFIG)
             })
             
             # Add this AI to the channel's AI configurations
-            channel_data[ai_name] = session
+            channel_data[ai_name] = session_state
             await func.update_session_data(server_id, channel_id_str, channel_data)
             
-            greetings, reply_system = await cai.initialize_session_messages(session, server_id, channel_id_str)
-            if greetings:
-                try:
-                    await channel.send(greetings)
-                    func.log.info(f"Greeting message sent as bot for AI {ai_name} in channel {channel_id_str}")
-                except Exception as e:
-                    func.log.error(f"Error sending greeting as bot: {e}")
-            if reply_system:
-                try:
-                    await channel.send(reply_system)
-                    func.log.info(f"System message sent as bot for AI {ai_name} in channel {channel_id_str}")
-                except Exception as e:
-                    func.log.error(f"Error sending system message as bot: {e}")
+            greetings, reply_system = await cai.initialize_session_messages(session_state, server_id, channel_id_str)
+            await self._send_initial_messages(
+                channel.send, greetings, reply_system, ai_name, channel_id_str, "as bot")
             
             # Mark setup as complete
-            channel_data[ai_name]["setup_has_already"] = True
+            session_state["setup_has_already"] = True
             await func.update_session_data(server_id, channel_id_str, channel_data)
             
             await interaction.followup.send(
@@ -348,14 +465,13 @@ Now, send your message introducing yourself in the chat, following the language
         session["setup_has_already"] = False
         session["chat_id"] = chat_id if chat_id else None
         
-        # Update the specific AI in channel data
-        channel_data[ai_name] = session
+        # session is the dict held in channel_data, so the channel data already carries the change
         await func.update_session_data(server_id, channel_id_str, channel_data)
         
         greetings, reply_system = await cai.initialize_session_messages(session, server_id, channel_id_str)
         
         # Mark setup as complete
-        channel_data[ai_name]["setup_has_already"] = True
+        session["setup_has_already"] = True
         await func.update_session_data(server_id, channel_id_str, channel_data)
         
         if session.get("mode") == "webhook":
@@ -367,32 +483,14 @@ Now, send your message introducing yourself in the chat, following the language
                     ephemeral=True
                 )
                 return
-            if greetings and WB_url:
-                try:
-                    await webhook_send(WB_url, greetings, session)
-                    func.log.info("Greeting message sent via webhook for AI %s in channel %s", ai_name, channel_id_str)
-                except Exception as e:
-                    func.log.error("Error sending greeting via webhook for AI %s in channel %s: %s", ai_name, channel_id_str, e)
-            if reply_system and WB_url:
-                try:
-                    await webhook_send(WB_url, reply_system, session)
-                    func.log.info("System message sent via webhook for AI %s in channel %s", ai_name, channel_id_str)
-                except Exception as e:
-                    func.log.error("Error sending system message via webhook for AI %s in channel %s: %s", ai_name, channel_id_str, e)
+            await self._send_initial_messages(
+                lambda text: webhook_send(WB_url, text, session),
+                greetings, reply_system, ai_name, channel_id_str, "via webhook")
         else:
             channel_obj = interaction.guild.get_channel(int(channel_id_str))
-            if greetings and channel_obj:
-                try:
-                    await channel_obj.send(greetings)
-                    func.log.info(f"Greeting message sent as bot for AI {ai_name} in channel {channel_id_str}")
-                except Exception as e:
-                    func.log.error(f"Error sending greeting as bot: {e}")
-            if reply_system and channel_obj:
-                try:
-                    await channel_obj.send(reply_system)
-                    func.log.info(f"System message sent as bot for AI {ai_name} in channel {channel_id_str}")
-                except Exception as e:
-                    func.log.error(f"Error sending system message as bot: {e}")
+            if channel_obj:
+                await self._send_initial_messages(
+                    channel_obj.send, greetings, reply_system, ai_name, channel_id_str, "as bot")
         await interaction.followup.send(
             f"Chat ID configuration successful for AI '{ai_name}'! Current chat ID: `{session['chat_id']}`",
             ephemeral=True
@@ -423,9 +521,8 @@ Now, send your message introducing yourself in the chat, following the language
             webhook_url = session.get("webhook_url")
             if webhook_url:
                 try:
-                    async with aiohttp.ClientSession() as aio_session:
-                        webhook_obj = discord.Webhook.from_url(webhook_url, session=aio_session)
-                        await webhook_obj.delete(reason=f"AI '{ai_name}' removed from channel")
+                    webhook_obj = _webhooks.pop(webhook_url, None) or discord.Webhook.from_url(webhook_url, session=self.http)
+                    await webhook_obj.delete(reason=f"AI '{ai_name}' removed from channel")
                     func.log.info(f"Deleted webhook for AI '{ai_name}' in channel {channel_id_str}")
                 except Exception as e:
                     func.log.error(f"Failed to delete webhook for AI '{ai_name}': {e}")
@@ -492,16 +589,26 @@ Now, send your message introducing yourself in the chat, following the language
 async def webhook_send(url: str, message: str, session_config: dict) -> None:
     """
     Send a message via webhook.
+
+    In line-by-line mode a failed line is logged and the remaining lines are
+    still sent; the first failure is raised once all lines were attempted.
     """
-    async with aiohttp.ClientSession() as session:
-        webhook_obj = discord.Webhook.from_url(url, session=session)
-        if session_config["config"].get("send_message_line_by_line", False):
-            lines = message.split('\n')
-            for line in lines:
-                if line.strip():
-                    await webhook_obj.send(line)
-        else:
-            await webhook_obj.send(message)
+    webhook_obj = get_webhook(url)
+    if session_config["config"].get("send_message_line_by_line", False):
+        first_error = None
+        for line in message.split('\n'):
+            if not line.strip():
+                continue
+            try:
+                await webhook_obj.send(line)
+            except Exception as e:
+                func.log.error("Error sending webhook line: %s", e)
+                if first_error is None:
+                    first_error = e
+        if first_error is not None:
+            raise first_error
+    else:
+        await webhook_obj.send(message)
 
 async def setup(bot):
     await bot.add_cog(AIManager(bot))
@@ -1,4 +1,4 @@
-import time
+import asyncio
 import discord
 from discord import app_commands
 from discord.ext import commands
@@ -7,6 +7,33 @@ import utils.func as func
 from AI.cai import get_bot_info, get_client
 from commands.ai_manager import AIManager # Import AIManager to access its autocomplete
 
+# Bind frequently used helpers once to skip the module attribute lookups in every command
+_get_ai_session = func.get_ai_session_data_from_all_channels
+_get_session = func.get_session_data
+_update_session = func.update_session_data
+_log = func.log
+
+# Static parts of the character info embed, shared by every embed we build
+_FOOTER_TEXT = "Character.AI bots are available on Discord thanks to Hashi!"
+_LEARN_MORE_NAME = "🔗 Learn More about Hashi"
+_LEARN_MORE_VALUE = "[GitHub Repository](https://github.com/LixxRarin/Hashi-CharacterAI-Discord)"
+_EMBED_COLOR = discord.Color.blue().value
+_NEWLINE_TABLE = str.maketrans({"\n": " ", "\r": " "})
+
+# (gateway limit, API limit, status) in ms, checked in order; the last row always matches
+_PING_STATUS = (
+    (100, 200, "Your connection is very fast!"),
+    (200, 350, "Your connection is stable."),
+    (300, 500, "Your connection is somewhat slow."),
+    (float("inf"), float("inf"), "Your connection is very slow! Expect delays."),
+)
+# (gateway threshold, API threshold, warning) in ms; -1 means that ping is not checked
+_PING_WARNINGS = (
+    (400, -1, "High gateway latency! The bot may be slow to respond."),
+    (-1, 700, "High API latency! Discord's response times may be delayed."),
+    (500, 800, "**Severe connection issues detected!** Commands may be very slow."),
+)
+
 
 class SlashCommands(commands.Cog):
     def __init__(self, bot):
@@ -29,7 +56,7 @@ class SlashCommands(commands.Cog):
         
         if ai_name:
             # Show info for specific AI
-            found_ai_data = func.get_ai_session_data_from_all_channels(server_id, ai_name)
+            found_ai_data = _get_ai_session(server_id, ai_name)
             
             if not found_ai_data:
                 await interaction.followup.send(f"AI '{ai_name}' not found in this server.")
@@ -45,17 +72,35 @@ class SlashCommands(commands.Cog):
             await self._show_character_info(interaction, character_id, ai_name)
         else:
             # Show info for all AIs in the current channel
-            channel_data = func.get_session_data(server_id, channel_id_str)
+            channel_data = _get_session(server_id, channel_id_str)
             
             if not channel_data:
                 await interaction.followup.send("There are no AIs configured in this channel.")
                 return
             
+            # Fetch each distinct character once, concurrently; AIs sharing a character reuse the result
+            ai_characters = [(name, data.get("character_id")) for name, data in channel_data.items()
+                             if data.get("character_id")]
+            character_ids = list(dict.fromkeys(character_id for _, character_id in ai_characters))
+            results = await asyncio.gather(
+                *(get_bot_info(character_id=character_id) for character_id in character_ids),
+                return_exceptions=True
+            )
+            bot_infos = {}
+            for character_id, result in zip(character_ids, results):
+                if isinstance(result, asyncio.CancelledError):
+                    # Don't swallow cancellation (e.g. during cog unload) as a lookup failure
+                    raise result
+                if isinstance(result, Exception):
+                    _log.error(f"Failed to retrieve bot info: {result}")
+                elif result:
+                    bot_infos[character_id] = result
+
             embeds = []
-            for ai_name_in_channel, ai_data in channel_data.items():
-                character_id = ai_data.get("character_id")
-                if character_id:
-                    embed = await self._get_character_embed(character_id, ai_name_in_channel)
+            for ai_name_in_channel, character_id in ai_characters:
+                bot_data = bot_infos.get(character_id)
+                if bot_data:
+                    embed = await self._get_character_embed(character_id, ai_name_in_channel, bot_data)
                     if embed:
                         embeds.append(embed)
             
@@ -76,7 +121,7 @@ class SlashCommands(commands.Cog):
             # Fetch bot info
             bot_data = await get_bot_info(character_id=character_id)
         except Exception as e:
-            func.log.error(f"Failed to retrieve bot info: {e}")
+            _log.error(f"Failed to retrieve bot info: {e}")
             await interaction.followup.send("❌ **Error:** Unable to retrieve bot information. Please try again later.")
             return
 
@@ -95,72 +140,59 @@ class SlashCommands(commands.Cog):
             try:
                 bot_data = await get_bot_info(character_id=character_id)
             except Exception as e:
-                func.log.error(f"Failed to retrieve bot info: {e}")
+                _log.error(f"Failed to retrieve bot info: {e}")
                 return None
         
         if not bot_data:
             return None
 
         # Extract relevant details
-        name = bot_data.get("name", "Unknown Bot")
+        # Keys may be present with a None value; from_dict passes values through as-is
+        name = bot_data.get("name") or "Unknown Bot"
         avatar_url = bot_data.get("avatar_url", None)
-        title = bot_data.get("title", "No title available.")
-        description = bot_data.get("description", "No description provided.").replace("\n", " ")
-        visibility = bot_data.get("visibility", "Unknown")
-        interactions = bot_data.get("num_interactions", 0)
-        author = bot_data.get("author_username", "Unknown Author")
-
-        # Create embed
-        embed = discord.Embed(
-            title=f"{name} - Character Information ({ai_name})",
-            description=f"**{title}**\n\n{description}",
-            color=discord.Color.blue()
-        )
+        title = bot_data.get("title") or "No title available."
+        description = str(bot_data.get("description") or "No description provided.").translate(_NEWLINE_TABLE)
+        visibility = bot_data.get("visibility") or "Unknown"
+        interactions = bot_data.get("num_interactions") or 0
+        author = bot_data.get("author_username") or "Unknown Author"
+
+        # Build the whole embed payload at once and let discord.py parse it
+        payload = {
+            "title": f"{name} - Character Information ({ai_name})",
+            "description": f"**{title}**\n\n{description}",
+            "color": _EMBED_COLOR,
+            "fields": [
+                {"name": "👤 Creator:", "value": str(author), "inline": True},
+                {"name": "🔄 Total Interactions:", "value": f"{interactions:,}", "inline": True},
+                {"name": "🌎 Visibility:", "value": str(visibility).capitalize(), "inline": True},
+                {"name": _LEARN_MORE_NAME, "value": _LEARN_MORE_VALUE, "inline": False},
+            ],
+            "footer": {"text": _FOOTER_TEXT},
+        }
         if avatar_url:
-            embed.set_thumbnail(url=avatar_url)
-
-        embed.add_field(name="👤 Creator:", value=author, inline=True)
-        embed.add_field(name="🔄 Total Interactions:", value=f"{interactions:,}", inline=True)
-        embed.add_field(name="🌎 Visibility:", value=visibility.capitalize(), inline=True)
-        embed.set_footer(text="Character.AI bots are available on Discord thanks to Hashi!")
-        embed.add_field(
-            name="🔗 Learn More about Hashi",
-            value="[GitHub Repository](https://github.com/LixxRarin/Hashi-CharacterAI-Discord)", inline=False)
+            payload["thumbnail"] = {"url": avatar_url}
+        embed = discord.Embed.from_dict(payload)
 
         return embed
 
     @app_commands.command(name="ping", description="Displays latency and possible connection issues.")
     async def ping(self, interaction: discord.Interaction):
         # Measure API ping by timing the message response
-        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        start = loop.time()
         await interaction.response.send_message("Calculating ping...")
-        end = time.perf_counter()
-        api_ping = round((end - start) * 1000)  # API ping in milliseconds
+        api_ping = round((loop.time() - start) * 1000)  # API ping in milliseconds
 
         # Get the WebSocket (gateway) latency
         gateway_ping = round(self.bot.latency * 1000)
 
-        # Determine connection speed status
-        if gateway_ping < 100 and api_ping < 200:
-            speed_status = "Your connection is very fast!"
-        elif gateway_ping < 200 and api_ping < 350:
-            speed_status = "Your connection is stable."
-        elif gateway_ping < 300 and api_ping < 500:
-            speed_status = "Your connection is somewhat slow."
-        else:
-            speed_status = "Your connection is very slow! Expect delays."
+        # Determine connection speed status: first row whose limits both pings stay under
+        speed_status = next(status for gw_limit, api_limit, status in _PING_STATUS
+                            if gateway_ping < gw_limit and api_ping < api_limit)
 
         # Check for potential connection issues
-        warnings = []
-        if gateway_ping > 400:
-            warnings.append(
-                "High gateway latency! The bot may be slow to respond.")
-        if api_ping > 700:
-            warnings.append(
-                "High API latency! Discord's response times may be delayed.")
-        if gateway_ping > 500 and api_ping > 800:
-            warnings.append(
-                "**Severe connection issues detected!** Commands may be very slow.")
+        warnings = [warning for gw_limit, api_limit, warning in _PING_WARNINGS
+                    if gateway_ping > gw_limit and api_ping > api_limit]
 
         # Format warning message (if any issues exist)
         warning_message = "\n".join(
@@ -223,7 +255,7 @@ class SlashCommands(commands.Cog):
         server_id = str(interaction.guild.id)
         channel_id = str(interaction.channel.id)
         
-        found_ai_data = func.get_ai_session_data_from_all_channels(server_id, ai_name)
+        found_ai_data = _get_ai_session(server_id, ai_name)
         
         if not found_ai_data:
             await interaction.response.send_message(f"AI '{ai_name}' not found in this server.", ephemeral=True)
@@ -232,7 +264,7 @@ class SlashCommands(commands.Cog):
         found_channel_id, session = found_ai_data
         
         # If the AI is found in a different channel, we need to get the channel_data for that channel
-        channel_data = func.get_session_data(server_id, found_channel_id)
+        channel_data = _get_session(server_id, found_channel_id)
 
         # Shortcut to the configuration dictionary
         config = session.setdefault("config", {})
@@ -300,7 +332,7 @@ class SlashCommands(commands.Cog):
         channel_data[ai_name] = session
         
         # Save the updated configuration back to the session
-        await func.update_session_data(server_id, channel_id, channel_data)
+        await _update_session(server_id, channel_id, channel_data)
         await interaction.response.send_message(f"Configuration updated successfully for AI '{ai_name}'!", ephemeral=True)
 
     @app_commands.command(name="copy_config", description="Copies all settings from one AI to another!")
@@ -314,8 +346,8 @@ class SlashCommands(commands.Cog):
     async def copy_config(self, interaction: discord.Interaction, from_ai_name: str, to_ai_name: str):
         server_id = str(interaction.guild.id)
         
-        from_ai_data = func.get_ai_session_data_from_all_channels(server_id, from_ai_name)
-        to_ai_data = func.get_ai_session_data_from_all_channels(server_id, to_ai_name)
+        from_ai_data = _get_ai_session(server_id, from_ai_name)
+        to_ai_data = _get_ai_session(server_id, to_ai_name)
 
         if not from_ai_data:
             await interaction.response.send_message(f"⚠️ AI '{from_ai_name}' not found in this server.", ephemeral=True)
@@ -328,16 +360,16 @@ class SlashCommands(commands.Cog):
         to_channel_id, to_session = to_ai_data
 
         # Get the full channel data for both source and target channels
-        from_channel_data = func.get_session_data(server_id, from_channel_id)
-        to_channel_data = func.get_session_data(server_id, to_channel_id)
+        from_channel_data = _get_session(server_id, from_channel_id)
+        to_channel_data = _get_session(server_id, to_channel_id)
 
         # Copy config from source AI to target AI
         to_channel_data[to_ai_name]["config"] = from_channel_data[from_ai_name]["config"].copy()
         
         # Update session data for the target channel
-        await func.update_session_data(server_id, to_channel_id, to_channel_data)
+        await _update_session(server_id, to_channel_id, to_channel_data)
 
-        await func.update_session_data(server_id, to_channel_id, to_channel_data)
+        await _update_session(server_id, to_channel_id, to_channel_data)
 
         await interaction.response.send_message(f"Settings successfully copied from AI '{from_ai_name}' to AI '{to_ai_name}' in this channel!", ephemeral=True)
 
@@ -353,7 +385,7 @@ class SlashCommands(commands.Cog):
         # Load session data
         server_id = str(interaction.guild.id)
         
-        found_ai_data = func.get_ai_session_data_from_all_channels(server_id, ai_name)
+        found_ai_data = _get_ai_session(server_id, ai_name)
         
         if not found_ai_data:
             await interaction.response.send_message(f"❌ AI '{ai_name}' not found in this server.", ephemeral=True)
@@ -365,7 +397,7 @@ class SlashCommands(commands.Cog):
             # Get AI-specific configuration
             ai_config = session["config"]
         except KeyError:
-            func.log.warning(f"No configuration found for AI '{ai_name}' in channel: {found_channel_id}")
+            _log.warning(f"No configuration found for AI '{ai_name}' in channel: {found_channel_id}")
             await interaction.response.send_message(f"❌ No configuration found for AI '{ai_name}' in this server.", ephemeral=True)
             return
 
@@ -391,7 +423,7 @@ class SlashCommands(commands.Cog):
     async def mute(self, interaction: discord.Interaction, ai_name: str, user: discord.Member):
         server_id = str(interaction.guild.id)
         
-        found_ai_data = func.get_ai_session_data_from_all_channels(server_id, ai_name)
+        found_ai_data = _get_ai_session(server_id, ai_name)
         
         if not found_ai_data:
             await interaction.response.send_message(f"AI '{ai_name}' not found in this server.", ephemeral=True)
@@ -400,7 +432,7 @@ class SlashCommands(commands.Cog):
         found_channel_id, session = found_ai_data
         
         # Get the full channel data for the found channel
-        channel_data = func.get_session_data(server_id, found_channel_id)
+        channel_data = _get_session(server_id, found_channel_id)
 
         if user.id not in session["muted_users"]:
             session["muted_users"].append(user.id)
@@ -410,7 +442,7 @@ class SlashCommands(commands.Cog):
 
         # Update the specific AI in channel data
         channel_data[ai_name] = session
-        await func.update_session_data(server_id, found_channel_id, channel_data)
+        await _update_session(server_id, found_channel_id, channel_data)
 
     @app_commands.command(name="unmute", description="Unmute a user so the AI captures their messages")
     @app_commands.default_permissions(administrator=True)
@@ -422,7 +454,7 @@ class SlashCommands(commands.Cog):
     async def unmute(self, interaction: discord.Interaction, ai_name: str, user: discord.Member):
         server_id = str(interaction.guild.id)
         
-        found_ai_data = func.get_ai_session_data_from_all_channels(server_id, ai_name)
+        found_ai_data = _get_ai_session(server_id, ai_name)
         
         if not found_ai_data:
             await interaction.response.send_message(f"AI '{ai_name}' not found in this server.", ephemeral=True)
@@ -431,7 +463,7 @@ class SlashCommands(commands.Cog):
         found_channel_id, session = found_ai_data
         
         # Get the full channel data for the found channel
-        channel_data = func.get_session_data(server_id, found_channel_id)
+        channel_data = _get_session(server_id, found_channel_id)
 
         if user.id in session["muted_users"]:
             session["muted_users"].remove(user.id)
@@ -441,7 +473,7 @@ class SlashCommands(commands.Cog):
 
         # Update the specific AI in channel data
         channel_data[ai_name] = session
-        await func.update_session_data(server_id, found_channel_id, channel_data)
+        await _update_session(server_id, found_channel_id, channel_data)
 
     @app_commands.command(name="list_muted", description="List all muted users for a specific AI")
     @app_commands.default_permissions(administrator=True)
@@ -452,7 +484,7 @@ class SlashCommands(commands.Cog):
     async def list_muted(self, interaction: discord.Interaction, ai_name: str):
         server_id = str(interaction.guild.id)
         
-        found_ai_data = func.get_ai_session_data_from_all_channels(server_id, ai_name)
+        found_ai_data = _get_ai_session(server_id, ai_name)
         
         if not found_ai_data:
             await interaction.response.send_message(f"AI '{ai_name}' not found in this server.", ephemeral=True)
@@ -461,7 +493,7 @@ class SlashCommands(commands.Cog):
         found_channel_id, session = found_ai_data
         
         # Get the full channel data for the found channel
-        channel_data = func.get_session_data(server_id, found_channel_id)
+        channel_data = _get_session(server_id, found_channel_id)
         muted_users = session.get("muted_users", [])
 
         if not muted_users:
@@ -488,7 +520,7 @@ class SlashCommands(commands.Cog):
         if func.config_yaml["Options"]["enable_alternative_cai_token"]:
             server_id = str(interaction.guild.id)
             
-            found_ai_data = func.get_ai_session_data_from_all_channels(server_id, ai_name)
+            found_ai_data = _get_ai_session(server_id, ai_name)
             
             if not found_ai_data:
                 await interaction.response.send_message(f"AI '{ai_name}' not found in this server.", ephemeral=True)
@@ -497,7 +529,7 @@ class SlashCommands(commands.Cog):
             found_channel_id, session = found_ai_data
             
             # Get the full channel data for the found channel
-            channel_data = func.get_session_data(server_id, found_channel_id)
+            channel_data = _get_session(server_id, found_channel_id)
 
             try:
                 client = await get_client(token)
@@ -512,7 +544,7 @@ class SlashCommands(commands.Cog):
             channel_data[ai_name] = session
             
             # Update session data
-            await func.update_session_data(server_id, found_channel_id, channel_data)
+            await _update_session(server_id, found_channel_id, channel_data)
 
             # Confirmation message
             if session["alt_token"] is None:
@@ -1,25 +1,34 @@
 import asyncio
 import time
+from collections import defaultdict
 from typing import Dict, Any, Optional, Set, List
 
-import aiohttp
-import discord
-
 import AI.cai as cai
 import utils.func as func
 import commands.ai_manager as ai_manager
 
+# Seconds of typing quiet before the refreshed timestamps are persisted
+TYPING_FLUSH_DELAY = 0.5
+# Inactivity monitor: recheck interval while a response is pending, and while there is nothing to answer
+MONITOR_BUSY_INTERVAL = 0.5
+MONITOR_IDLE_INTERVAL = 30
+
 
 class discord_AI_bot:
     def __init__(self):
         """Initialize the bot's tracking variables."""
         self.response_lock = asyncio.Lock()
-        # Track active response tasks by channel ID
-        self.active_tasks: Dict[str, asyncio.Task] = {}
-        # Set of channels currently being processed
-        self.processing_channels: Set[str] = set()
+        # Track active monitor and response tasks by (kind, server_id, channel_id, ai_name);
+        # finished tasks remove themselves, see _track_task
+        self.active_tasks: Dict[tuple, asyncio.Task] = {}
+        # (server_id, channel_id, ai_name) of AIs currently being processed
+        self.processing_channels: Set[tuple] = set()
         # Locks for each channel
-        self.channel_locks: Dict[str, asyncio.Lock] = {}
+        self.channel_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        # Pending typing persists by (server_id, channel_id)
+        self._pending_flush: Dict[tuple, asyncio.TimerHandle] = {}
+        # Wakes an AI's inactivity monitor on new messages or typing, by (server_id, channel_id, ai_name)
+        self._activity_events: Dict[tuple, asyncio.Event] = {}
 
     async def sync_config(self, client):
         """
@@ -31,7 +40,11 @@ class discord_AI_bot:
         """
         func.log.info(
             "Synchronizing webhook configurations with Character.AI")
-        for server_id, server_info in func.session_cache.items():
+        # Several AIs can share a character; fetch its info once per sync
+        info_by_character: Dict[str, Optional[Dict[str, Any]]] = {}
+        # Reuse the bot's pooled session so every webhook doesn't pay a new TLS handshake
+        http_session = ai_manager.get_http_session()
+        for server_id, server_info in func.get_session_cache_view().items():
             for channel_id, channel_data in server_info.get("channels", {}).items():
                 # Process each AI in the channel
                 for ai_name, session_data in channel_data.items():
@@ -41,33 +54,51 @@ class discord_AI_bot:
                             "No character_id found for AI %s in channel %s in server %s", ai_name, channel_id, server_id)
                         continue
 
-                    try:
-                        info = await cai.get_bot_info(character_id=character_id)
-                        if not info:
-                            func.log.error(
-                                "Failed to get bot info for character_id %s", character_id)
-                            continue
+                    webhook_url = session_data.get("webhook_url")
+                    if not webhook_url:
+                        continue
+
+                    # Only touch the parts of the webhook profile this AI takes from Character.AI
+                    ai_config = session_data.get("config", {})
+                    use_avatar = ai_config.get("use_cai_avatar", True)
+                    use_name = ai_config.get("use_cai_display_name", True)
+                    if not use_avatar and not use_name:
                         func.log.debug(
-                            "Fetched bot info for character_id %s: %s", character_id, info["name"])
-                    except Exception as e:
-                        func.log.error(
-                            "Failed to get bot info from C.AI for character_id %s: %s", character_id, e)
+                            "AI %s in channel %s does not use Character.AI name or avatar, skipping sync", ai_name, channel_id)
                         continue
 
-                    webhook_url = session_data.get("webhook_url")
-                    if webhook_url:
+                    if character_id not in info_by_character:
                         try:
-                            async with aiohttp.ClientSession() as http_session:
-                                async with http_session.get(info["avatar_url"]) as resp:
-                                    image_bytes = await resp.read() if resp.status == 200 else b""
-                                webhook_obj = discord.Webhook.from_url(
-                                    webhook_url, session=http_session)
-                                await webhook_obj.edit(name=info["name"], avatar=image_bytes, reason="Sync webhook info")
-                                func.log.info(
-                                    "Updated webhook for AI %s in channel %s with new info from character_id %s", ai_name, channel_id, character_id)
+                            info_by_character[character_id] = await cai.get_bot_info(character_id=character_id)
                         except Exception as e:
                             func.log.error(
-                                "Failed to update webhook for AI %s in channel %s: %s", ai_name, channel_id, e)
+                                "Failed to get bot info from C.AI for character_id %s: %s", character_id, e)
+                            info_by_character[character_id] = None
+                    info = info_by_character[character_id]
+                    if not info:
+                        func.log.error(
+                            "Failed to get bot info for character_id %s", character_id)
+                        continue
+                    func.log.debug(
+                        "Fetched bot info for character_id %s: %s", character_id, info["name"])
+
+                    try:
+                        edit_kwargs = {}
+                        if use_name:
+                            edit_kwargs["name"] = info["name"]
+                        if use_avatar:
+                            async with http_session.get(info["avatar_url"]) as resp:
+                                if resp.status == 200:
+                                    edit_kwargs["avatar"] = await resp.read()
+                        if not edit_kwargs:
+                            continue
+                        webhook_obj = ai_manager.get_webhook(webhook_url)
+                        await webhook_obj.edit(**edit_kwargs, reason="Sync webhook info")
+                        func.log.info(
+                            "Updated webhook for AI %s in channel %s with new info from character_id %s", ai_name, channel_id, character_id)
+                    except Exception as e:
+                        func.log.error(
+                            "Failed to update webhook for AI %s in channel %s: %s", ai_name, channel_id, e)
 
     def time_typing(self, channel, user, client):
         """
@@ -93,12 +124,10 @@ class discord_AI_bot:
                 # Update timestamp for all AIs in this channel
                 for ai_name, ai_session in channel_data.items():
                     ai_session["last_message_time"] = current_time
+                    self._notify_activity(server_id, channel_id_str, ai_name)
 
-                # Always update timestamp and persist
-                asyncio.create_task(
-                    func.update_session_data(
-                        server_id, channel_id_str, channel_data)
-                )
+                # The in-memory session is already current; persist once typing settles
+                self._schedule_flush(server_id, channel_id_str)
 
                 func.log.debug(
                     f"Typing activity from {user} in {channel.name}, "
@@ -108,6 +137,32 @@ class discord_AI_bot:
         except Exception as e:
             func.log.error(f"Typing handler error: {str(e)}", exc_info=True)
 
+    def _schedule_flush(self, server_id: str, channel_id: str):
+        """
+        Persists a channel's session data after TYPING_FLUSH_DELAY, restarting the
+        delay on each call so a burst of typing events produces a single update.
+        """
+        key = (server_id, channel_id)
+        handle = self._pending_flush.pop(key, None)
+        if handle is not None:
+            handle.cancel()
+        self._pending_flush[key] = asyncio.get_running_loop().call_later(
+            TYPING_FLUSH_DELAY, self._flush_channel, server_id, channel_id)
+
+    def _flush_channel(self, server_id: str, channel_id: str):
+        self._pending_flush.pop((server_id, channel_id), None)
+        # Re-read the channel so a removal during the delay is not undone
+        channel_data = func.get_session_data(server_id, channel_id)
+        if channel_data:
+            asyncio.create_task(
+                func.update_session_data(server_id, channel_id, channel_data))
+
+    def _notify_activity(self, server_id: str, channel_id: str, ai_name: str):
+        """Wakes the AI's inactivity monitor, if one is running, to re-evaluate its timers."""
+        event = self._activity_events.get((server_id, channel_id, ai_name))
+        if event is not None:
+            event.set()
+
     async def read_channel_messages(self, message, client):
         """
         Process a message from a monitored channel.
@@ -177,18 +232,18 @@ class discord_AI_bot:
             channel_id_str: The channel ID
         """
         try:
-            # Get or create a lock for this channel
-            if channel_id_str not in self.channel_locks:
-                self.channel_locks[channel_id_str] = asyncio.Lock()
-
-            # Try to acquire the lock with a timeout
-            try:
-                # Use a short timeout to prevent deadlocks
-                await asyncio.wait_for(self.channel_locks[channel_id_str].acquire(), timeout=5.0)
-            except asyncio.TimeoutError:
-                func.log.warning(
-                    f"Timeout acquiring lock for channel {channel_id_str}")
-                return
+            lock = self.channel_locks[channel_id_str]
+            if lock.locked():
+                # Only a contended lock needs the timeout (and the task wait_for wraps it in)
+                try:
+                    # Use a short timeout to prevent deadlocks
+                    await asyncio.wait_for(lock.acquire(), timeout=5.0)
+                except asyncio.TimeoutError:
+                    func.log.warning(
+                        f"Timeout acquiring lock for channel {channel_id_str}")
+                    return
+            else:
+                await lock.acquire()
 
             try:
                 channel_data = func.get_session_data(server_id, channel_id_str)
@@ -219,19 +274,17 @@ class discord_AI_bot:
                 for ai_name, ai_session in channel_data.items():
                     ai_session["last_message_time"] = current_time
                     ai_session["awaiting_response"] = False
+                    self._notify_activity(server_id, channel_id_str, ai_name)
                 
                 await func.update_session_data(server_id, channel_id_str, channel_data)
 
             finally:
                 # Always release the lock
-                self.channel_locks[channel_id_str].release()
+                lock.release()
 
         except Exception as e:
             func.log.error(
                 f"Error in _process_channel_message for channel {channel_id_str}: {e}")
-            # Make sure to release the lock in case of error
-            if channel_id_str in self.channel_locks and self.channel_locks[channel_id_str].locked():
-                self.channel_locks[channel_id_str].release()
 
     async def AI_send_message(self, client, message, target_channel_id, ai_name):
         """
@@ -247,7 +300,7 @@ class discord_AI_bot:
         channel_id_str = target_channel_id
 
         # Skip if this specific AI is already being processed
-        ai_key = f"{server_id}_{channel_id_str}_{ai_name}"
+        ai_key = (server_id, channel_id_str, ai_name)
         if ai_key in self.processing_channels:
             func.log.debug(
                 f"AI {ai_name} in channel {channel_id_str} is already being processed, skipping")
@@ -279,7 +332,7 @@ class discord_AI_bot:
             await func.update_session_data(server_id, channel_id_str, channel_data)
 
             # Get cached messages for this channel
-            cached_data = await asyncio.to_thread(func.read_json, "messages_cache.json") or {}
+            cached_data = func.get_message_cache()
 
             # Check if there are any messages to respond to
             if not cached_data.get(server_id, {}).get(channel_id_str, {}):
@@ -409,6 +462,16 @@ class discord_AI_bot:
                 channel_data[ai_name]["awaiting_response"] = False
                 await func.update_session_data(server_id, channel_id_str, channel_data)
 
+    def _track_task(self, key: tuple, task: asyncio.Task):
+        """Stores a task in active_tasks until it finishes, unless a newer task replaced it."""
+        self.active_tasks[key] = task
+
+        def _forget(done: asyncio.Task):
+            if self.active_tasks.get(key) is done:
+                del self.active_tasks[key]
+
+        task.add_done_callback(_forget)
+
     async def monitor_inactivity(self, client, message):
         """
         Checks if a channel has been inactive and triggers AI response if needed.
@@ -435,7 +498,7 @@ class discord_AI_bot:
         # Start monitor tasks for each AI in this channel
         for ai_name, ai_session in channel_data.items():
             # Create a unique task name for this AI monitor
-            task_name = f"monitor_{server_id}_{channel_id_str}_{ai_name}"
+            task_name = ("monitor", server_id, channel_id_str, ai_name)
 
             # Check if a monitor task is already running for this AI
             if task_name in self.active_tasks and not self.active_tasks[task_name].done():
@@ -443,10 +506,10 @@ class discord_AI_bot:
                 continue
 
             # Start a new monitor task for this AI
-            self.active_tasks[task_name] = asyncio.create_task(
+            self._track_task(task_name, asyncio.create_task(
                 self._monitor_ai_inactivity(
                     client, message, server_id, channel_id_str, ai_name, ai_session)
-            )
+            ))
 
     async def _monitor_ai_inactivity(self, client, message, server_id, channel_id_str, ai_name, session):
         """
@@ -460,9 +523,12 @@ class discord_AI_bot:
             ai_name: The name of the AI to monitor
             session: The session data for this AI
         """
+        ai_key = (server_id, channel_id_str, ai_name)
+        activity = self._activity_events.setdefault(ai_key, asyncio.Event())
         try:
             while True:
-                await asyncio.sleep(0.5)
+                # Cleared before looking at the state, so activity during the checks is not lost
+                activity.clear()
 
                 # Reload channel data to get latest status
                 current_channel_data = func.get_session_data(
@@ -476,50 +542,64 @@ class discord_AI_bot:
 
                 current_session = current_channel_data[ai_name]
 
-                # Skip if already awaiting response
-                if current_session.get("awaiting_response", False):
-                    continue
-
-                # Skip if this AI is already being processed
-                ai_key = f"{server_id}_{channel_id_str}_{ai_name}"
-                if ai_key in self.processing_channels:
+                # Poll while a response is pending or this AI is already being processed
+                if current_session.get("awaiting_response", False) or ai_key in self.processing_channels:
+                    await self._wait_for_activity(activity, MONITOR_BUSY_INTERVAL)
                     continue
 
                 # Check for inactivity or message threshold
-                cached_data = await asyncio.to_thread(func.read_json, "messages_cache.json") or {}
+                cached_data = func.get_message_cache()
                 ai_messages = cached_data.get(
                     server_id, {}).get(channel_id_str, {}).get(ai_name, {})
                 cache_count = len(ai_messages)
 
+                # Nothing to answer: sleep until a message arrives
+                if cache_count == 0:
+                    await self._wait_for_activity(activity, MONITOR_IDLE_INTERVAL)
+                    continue
+
                 time_since_last = time.time() - current_session.get("last_message_time", 0)
                 delay = current_session["config"].get("delay_for_generation", 5)
                 cache_threshold = current_session["config"].get("cache_count_threshold", 5)
 
-                if ((time_since_last >= delay or cache_count >= cache_threshold) and cache_count > 0):
+                if time_since_last >= delay or cache_count >= cache_threshold:
                     func.log.debug(
                         "Inactivity detected for AI %s in channel %s (%d seconds, %d messages). Triggering AI response.",
                         ai_name, channel_id_str, time_since_last, cache_count
                     )
 
                     # Cancel any existing response task for this AI
-                    task_key = f"ai_response_{server_id}_{channel_id_str}_{ai_name}"
-                    if task_key in self.active_tasks and not self.active_tasks[task_key].done():
-                        self.active_tasks[task_key].cancel()
+                    task_key = ("ai_response",) + ai_key
+                    previous = self.active_tasks.get(task_key)
+                    if previous is not None and not previous.done():
+                        previous.cancel()
                         try:
-                            await self.active_tasks[task_key]
+                            await previous
                         except asyncio.CancelledError:
                             pass
 
                     # Create a new response task for this AI
-                    self.active_tasks[task_key] = asyncio.create_task(
+                    self._track_task(task_key, asyncio.create_task(
                         self.AI_send_message(client, message, channel_id_str, ai_name)
-                    )
-
-                    # Wait for the response to complete
-                    # await asyncio.sleep(5)
+                    ))
+                    await self._wait_for_activity(activity, MONITOR_BUSY_INTERVAL)
+                else:
+                    # Sleep until the inactivity delay runs out; new activity restarts the wait
+                    await self._wait_for_activity(activity, delay - time_since_last)
         except asyncio.CancelledError:
             func.log.debug(
                 "Monitor task for AI %s in channel %s was cancelled", ai_name, channel_id_str)
         except Exception as e:
             func.log.error(
                 "Error in monitor_inactivity for AI %s in channel %s: %s", ai_name, channel_id_str, e)
+        finally:
+            if self._activity_events.get(ai_key) is activity:
+                del self._activity_events[ai_key]
+
+    @staticmethod
+    async def _wait_for_activity(event: asyncio.Event, timeout: float):
+        """Waits until the event is set or the timeout expires, whichever comes first."""
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
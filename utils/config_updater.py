@@ -1,8 +1,10 @@
+import asyncio
+import copy
 import os
+from io import StringIO
 
 from ruamel.yaml import YAML
 from ruamel.yaml.comments import CommentedMap
-from packaging import version
 
 import utils.func as func
 
@@ -10,6 +12,8 @@ import utils.func as func
 yaml = YAML(typ='rt')
 yaml.preserve_quotes = True
 yaml.encoding = "utf-8"
+# Plain loader for reads that are not written back; skips comment and quote bookkeeping
+yaml_fast = YAML(typ='safe')
 
 # Default configuration content
 DEFAULT_CONFIG_CONTENT = r"""version: "1.1.5" # Don't touch here
@@ -56,6 +60,41 @@ Options:
   # This mode should be off in production to avoid excessive logging.
 """
 
+# Parse the default configuration once; each ConfigManager works on its own deep copy
+_DEFAULT_CONFIG_PARSED = yaml.load(DEFAULT_CONFIG_CONTENT)
+
+
+def pack_semver(value):
+    """
+    Packs a plain MAJOR.MINOR.PATCH version string into one comparable int.
+
+    Returns None for anything else (pre-releases, extra components, non-strings),
+    in which case callers fall back to packaging.version (see version_less_than).
+    """
+    if not isinstance(value, str):
+        return None
+    parts = value.split(".")
+    if len(parts) != 3 or not all(part.isdigit() for part in parts):
+        return None
+    major, minor, patch = (int(part) for part in parts)
+    if max(major, minor, patch) >= 1 << 20:
+        return None
+    return (major << 40) | (minor << 20) | patch
+
+
+def version_less_than(a, b):
+    """Returns True if version string a is older than version string b."""
+    a_packed, b_packed = pack_semver(a), pack_semver(b)
+    if a_packed is not None and b_packed is not None:
+        return a_packed < b_packed
+    # Only irregular versions (pre-releases, extra components) need the full PEP 440 parser
+    from packaging import version
+    return version.parse(a) < version.parse(b)
+
+
+# Sentinel for keys missing from the user configuration
+_MISSING = object()
+
 
 def merge_ordered(user_cfg, default_cfg):
     """
@@ -71,12 +110,15 @@ def merge_ordered(user_cfg, default_cfg):
     Additionally, comment attributes (if present) are preserved from either configuration.
     """
     merged = CommentedMap()
+    # Resolve the comment tables once instead of probing for them on every key
+    user_ca = getattr(getattr(user_cfg, 'ca', None), 'items', None)
+    default_ca = getattr(getattr(default_cfg, 'ca', None), 'items', None)
     for key, default_val in default_cfg.items():
+        user_val = user_cfg.get(key, _MISSING)
         # If the user configuration contains the key, process its value
-        if key in user_cfg:
-            user_val = user_cfg[key]
-            # If both default and user values are dictionaries, merge them recursively
-            if isinstance(default_val, dict) and isinstance(user_val, dict):
+        if user_val is not _MISSING:
+            # If both default and user values are mappings, merge them recursively
+            if user_val is not default_val and isinstance(default_val, CommentedMap) and isinstance(user_val, CommentedMap):
                 merged[key] = merge_ordered(user_val, default_val)
             else:
                 # Use the user's value if it's not a dictionary or cannot be merged recursively
@@ -86,43 +128,80 @@ def merge_ordered(user_cfg, default_cfg):
             merged[key] = default_val
 
         # Preserve comment attributes if available in user_cfg; otherwise, fall back to default_cfg comments
-        if hasattr(user_cfg, 'ca') and key in user_cfg.ca.items:
-            merged.ca.items[key] = user_cfg.ca.items.get(key)
-        elif hasattr(default_cfg, 'ca') and key in default_cfg.ca.items:
-            merged.ca.items[key] = default_cfg.ca.items.get(key)
+        if user_ca is not None and key in user_ca:
+            merged.ca.items[key] = user_ca[key]
+        elif default_ca is not None and key in default_ca:
+            merged.ca.items[key] = default_ca[key]
     return merged
 
 
+def _same_shape(user_cfg, default_cfg):
+    """
+    Returns True if user_cfg has exactly the keys of default_cfg, in the same order,
+    at every level where both sides are mappings. Values and comments are ignored.
+
+    merge_ordered would then return the user's values unchanged.
+    """
+    if list(user_cfg.keys()) != list(default_cfg.keys()):
+        return False
+    for key, default_val in default_cfg.items():
+        user_val = user_cfg[key]
+        if isinstance(default_val, CommentedMap) and isinstance(user_val, CommentedMap):
+            if not _same_shape(user_val, default_val):
+                return False
+    return True
+
+
 class ConfigManager:
     def __init__(self, config_file="config.yml"):
         """
         Initializes the configuration manager.
 
-        - Loads the default configuration from DEFAULT_CONFIG_CONTENT.
-        - Attempts to load the user configuration from the given file.
+        - Copies the default configuration parsed from DEFAULT_CONFIG_CONTENT.
+        - The user configuration is loaded by check_and_update, off the event loop.
         """
         self.config_file = config_file
-        self.default_config = yaml.load(DEFAULT_CONFIG_CONTENT)
-        self.user_config = self.load_user_config()
+        self.default_config = copy.deepcopy(_DEFAULT_CONFIG_PARSED)
+        self._default_version = self.default_config.get("version")
+        self.user_config = None
 
-    def load_user_config(self):
+    def load_user_config(self, loader=None):
         """
         Loads the user configuration from the file.
 
+        Args:
+            loader: YAML instance to parse with; defaults to the round-trip loader,
+                which keeps comments and order for writing the file back.
+
         Returns:
             The parsed configuration if the file exists and is valid,
             otherwise returns None.
         """
-        if not os.path.exists(self.config_file):
-            return None
         try:
             with open(self.config_file, "r", encoding="utf-8") as f:
-                return yaml.load(f)
+                return (loader or yaml).load(f)
+        except FileNotFoundError:
+            return None
         except Exception as e:
             # Log error if loading the configuration fails
             func.log.error("Error loading user configuration: %s", e)
             return None
 
+    @staticmethod
+    def _write_yaml(path, data):
+        """
+        Writes data to the given path as YAML. Runs in a worker thread.
+
+        The document is rendered in memory, written to a temporary file and moved
+        into place, so a crash mid-write never leaves a truncated config behind.
+        """
+        buffer = StringIO()
+        yaml.dump(data, buffer)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp_path, path)
+
     def is_version_outdated(self):
         """
         Checks whether the user configuration is outdated compared to the default configuration.
@@ -135,13 +214,15 @@ class ConfigManager:
         """
         user_version = self.user_config.get(
             "version") if self.user_config else None
-        default_version = self.default_config.get("version")
+        default_version = self._default_version
         if user_version is None:
             # Log a warning if no version is found in the user configuration
             func.log.warning(
                 "No version found in user configuration. Assuming outdated.")
             return True
-        return version.parse(user_version) < version.parse(default_version)
+        if user_version == default_version:
+            return False
+        return version_less_than(user_version, default_version)
 
     def merge_configs(self):
         """
@@ -154,9 +235,13 @@ class ConfigManager:
         """
         if self.user_config is None:
             return self.default_config
+        if _same_shape(self.user_config, self.default_config):
+            # Nothing was added or removed, only the version needs bumping
+            self.user_config["version"] = self._default_version
+            return self.user_config
         merged = merge_ordered(self.user_config, self.default_config)
         # Ensure the "version" key is updated to the default version
-        merged["version"] = self.default_config.get("version")
+        merged["version"] = self._default_version
         return merged
 
     async def check_and_update(self):
@@ -167,13 +252,16 @@ class ConfigManager:
           - If the configuration file does not exist, it creates one using the default configuration.
           - If the user configuration is outdated (based on version comparison), it updates the file.
           - Logs all actions including successes, warnings, and errors.
+
+        File reads and writes run in a worker thread so the event loop is not blocked.
         """
+        # Checking the version only needs the values, so start with the fast loader
+        self.user_config = await asyncio.to_thread(self.load_user_config, yaml_fast)
         if self.user_config is None:
             func.log.warning(
                 "Configuration file '%s' not found. Creating a new one...", self.config_file)
             try:
-                with open(self.config_file, "w", encoding="utf-8") as f:
-                    yaml.dump(self.default_config, f)
+                await asyncio.to_thread(self._write_yaml, self.config_file, self.default_config)
                 func.log.info(
                     "Configuration file '%s' created successfully!", self.config_file)
             except Exception as e:
@@ -183,11 +271,12 @@ class ConfigManager:
 
         if self.is_version_outdated():
             func.log.warning("Updating configuration '%s' to version %s",
-                             self.config_file, self.default_config.get("version"))
+                             self.config_file, self._default_version)
+            # Re-read with the round-trip loader so the user's comments survive the rewrite
+            self.user_config = await asyncio.to_thread(self.load_user_config)
             updated_config = self.merge_configs()
             try:
-                with open(self.config_file, "w", encoding="utf-8") as f:
-                    yaml.dump(updated_config, f)
+                await asyncio.to_thread(self._write_yaml, self.config_file, updated_config)
                 func.log.info(
                     "Configuration file '%s' updated successfully!", self.config_file)
             except Exception as e:
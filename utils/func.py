@@ -1,14 +1,32 @@
 import asyncio
+import copy
 import datetime
+import functools
+import hashlib
 import json
 import logging
+import os
 import re
 import socket
+import sys
 import threading
-from typing import Any, Dict, Optional, Callable, Awaitable, TypeVar, Union
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Callable, Awaitable, TypeVar, Union
 
 import yaml
-from colorama import Fore, init
+from colorama import Fore, Style, init
+
+try:
+    # libyaml's C parser, when PyYAML was built with it
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+try:
+    # Optional: orjson parses and encodes JSON several times faster than the standard library
+    import orjson
+except ImportError:
+    orjson = None
 
 # Type definitions
 T = TypeVar('T')
@@ -16,40 +34,87 @@ SessionData = Dict[str, Any]
 CacheData = Dict[str, Dict[str, Dict[str, str]]]
 
 
+# Parsed copy of config.yml, see load_config. It contains the tokens, so it is owner-only
+CONFIG_CACHE_FILE = ".config.cache.json"
+# Bumped when the sidecar layout or permissions change, so older sidecars are rewritten
+CONFIG_CACHE_FORMAT = 2
+# Sidecar problems seen by load_config before logging is configured; logged at debug level afterwards
+_config_cache_errors: List[str] = []
+
+
 class ColoredFormatter(logging.Formatter):
     """Custom formatter that adds colors to log messages based on severity level."""
 
+    LOG_COLORS = {
+        "DEBUG": Fore.CYAN,
+        "INFO": Fore.GREEN,
+        "WARNING": Fore.YELLOW,
+        "ERROR": Fore.RED,
+        "CRITICAL": Fore.RED + "\033[1m",
+    }
+
     def format(self, record):
-        LOG_COLORS = {
-            "DEBUG": Fore.CYAN,
-            "INFO": Fore.GREEN,
-            "WARNING": Fore.YELLOW,
-            "ERROR": Fore.RED,
-            "CRITICAL": Fore.RED + "\033[1m",
-        }
-        log_color = LOG_COLORS.get(record.levelname, Fore.WHITE)
+        log_color = self.LOG_COLORS.get(record.levelname, Fore.WHITE)
 
         # Format timestamp using record time
-        timestamp = datetime.datetime.fromtimestamp(
-            record.created).strftime('%H:%M:%S')
+        timestamp = self.formatTime(record, '%H:%M:%S')
         message = record.getMessage()
 
         # Display: [HH:MM:SS] LEVEL    [file:line] - message
-        return f"{log_color}[{timestamp}] {record.levelname:<8} [{record.filename}:{record.lineno}] {Fore.RESET}- {message}"
+        return f"{log_color}[{timestamp}] {record.levelname:<8} [{record.filename}:{record.lineno}] {Style.RESET_ALL}- {message}"
 
 
 def load_config() -> Dict[str, Any]:
     """
     Loads configuration from the YAML file without using logging.
 
+    The parsed result is kept in a JSON sidecar (CONFIG_CACHE_FILE) tagged with the
+    YAML file's modification time and size; while those match, the sidecar is read
+    instead of parsing the YAML again. The sidecar holds the same tokens as config.yml,
+    so it is created readable by the owner only.
+
     Returns:
         Dict[str, Any]: Configuration data from config.yml
     """
+    try:
+        st = os.stat("config.yml")
+    except OSError:
+        return {}  # Return an empty dictionary on error
+    key = [st.st_mtime_ns, st.st_size]
+
+    try:
+        with open(CONFIG_CACHE_FILE, "r", encoding="utf-8") as file:
+            cached = json.load(file)
+        if cached.get("format") == CONFIG_CACHE_FORMAT and cached.get("key") == key:
+            return cached["data"]
+    except FileNotFoundError:
+        pass  # No sidecar yet, parse the YAML below
+    except Exception as e:
+        _config_cache_errors.append(f"Ignoring unreadable {CONFIG_CACHE_FILE}: {e}")
+
     try:
         with open("config.yml", "r", encoding="utf-8") as file:
-            data = yaml.safe_load(file)
+            data = yaml.load(file, Loader=_YamlLoader)
     except Exception:
-        data = {}  # Return an empty dictionary on error
+        return {}  # Return an empty dictionary on error
+
+    tmp_path = CONFIG_CACHE_FILE + ".tmp"
+    try:
+        # Encode first so a value JSON can't represent doesn't leave a partial file behind
+        payload = json.dumps({"format": CONFIG_CACHE_FORMAT, "key": key, "data": data}, ensure_ascii=False)
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(fd, "w", encoding="utf-8") as file:
+            file.write(payload)
+        # O_CREAT keeps the mode of a leftover tmp file, so set it explicitly
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, CONFIG_CACHE_FILE)
+    except Exception as e:
+        # Caching is best effort; the next start parses the YAML again
+        _config_cache_errors.append(f"Could not write {CONFIG_CACHE_FILE}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
     return data
 
 
@@ -63,8 +128,10 @@ def setup_logging(debug_mode=False) -> logging.Logger:
     Returns:
         logging.Logger: Configured root logger
     """
-    # Initialize colorama with autoreset enabled
-    init(autoreset=True)
+    # Terminals outside Windows understand ANSI codes natively; colorama's stream
+    # wrapper would only add overhead to every write there
+    if sys.platform == "win32":
+        init(autoreset=True)
 
     # Remove any existing handlers to ensure basicConfig applies correctly
     for handler in logging.root.handlers[:]:
@@ -102,14 +169,28 @@ debug_mode = config_yaml.get("Options", {}).get("debug_mode", False)
 
 # Next, configure logging
 log = setup_logging(debug_mode)
+for _message in _config_cache_errors:
+    log.debug(_message)
+_config_cache_errors.clear()
 
 # Session management
 session_cache: Dict[str, Any] = {}
 session_update_queue = asyncio.Queue()
-session_lock = threading.Lock()
-
-# Add this configuration to your config.yml file
-config_yaml = load_config()
+# Reentrant: read_json recreates missing or corrupt files through write_json while holding it
+session_lock = threading.RLock()
+# Seconds to wait for more session updates before writing session.json
+SESSION_FLUSH_INTERVAL = 0.1
+# Last known contents of session.json, keyed by the file's (mtime, size)
+_session_snapshot: Dict[str, Any] = {"key": None, "data": None}
+# Path -> (blake2b digest, (mtime, size)) of the last JSON document written there
+_write_hashes: Dict[str, tuple] = {}
+# Seconds to wait for more captured messages before writing messages_cache.json
+MESSAGE_CACHE_FLUSH_DELAY = 0.5
+# In-memory messages_cache.json; the file is only read once and written back after changes
+_cache_state: Dict[str, Any] = {"path": None, "data": None, "dirty": False, "flush_task": None}
+_message_cache_write_lock = asyncio.Lock()
+# (server_id, ai_name) -> channel_id of the last lookup; checked against session_cache before use
+_ai_channel_index: Dict[tuple, str] = {}
 
 
 async def timeout_async(func: Callable[[], Awaitable[T]], timeout: float,
@@ -134,6 +215,45 @@ async def timeout_async(func: Callable[[], Awaitable[T]], timeout: float,
             log.error("Error in on_timeout handler: %s", e)
 
 
+# Discord custom emojis (static and animated) or runs of Unicode emojis, removed in one pass
+_EMOJI_RE = re.compile(
+    r"<a?:\w+:\d+>"
+    "|[\U0001F600-\U0001F64F"  # Emoticons
+    "\U0001F300-\U0001F5FF"   # Symbols & pictographs
+    "\U0001F680-\U0001F6FF"   # Transport & map symbols
+    "\U0001F700-\U0001F77F"   # Alchemical symbols
+    "\U0001F780-\U0001F7FF"   # Geometric shapes extended
+    "\U0001F800-\U0001F8FF"   # Supplemental arrows-C
+    "\U0001F900-\U0001F9FF"   # Supplemental symbols and pictographs
+    "\U0001FA00-\U0001FA6F"   # Chess symbols, etc.
+    "\U0001FA70-\U0001FAFF"   # Symbols and pictographs extended-A
+    "\U00002702-\U000027B0"   # Dingbats
+    "\U000024C2-\U0001F251"   # Enclosed characters
+    "]+", flags=re.UNICODE)
+
+
+@functools.lru_cache(maxsize=128)
+def _compile_pattern_tuple(patterns: tuple) -> tuple:
+    return tuple(re.compile(pattern, re.MULTILINE) for pattern in patterns)
+
+
+def compile_patterns(patterns) -> tuple:
+    """
+    Compiles a list of regex strings with re.MULTILINE, reusing earlier compilations.
+
+    The lists come from each AI's config and rarely change, so they are cached by value
+    instead of relying on re's small internal cache.
+
+    Args:
+        patterns: Iterable of regex strings
+
+    Returns:
+        tuple: Compiled patterns, in the same order
+    """
+    return _compile_pattern_tuple(tuple(patterns))
+
+
+@functools.lru_cache(maxsize=1024)
 def remove_emoji(text: str) -> str:
     """
     Removes emoji characters from the given text, including Discord custom emojis.
@@ -144,29 +264,10 @@ def remove_emoji(text: str) -> str:
     Returns:
         str: Text with emojis removed
     """
-    # Regex pattern for Unicode emojis
-    emoji_pattern = re.compile(
-        "[\U0001F600-\U0001F64F"  # Emoticons
-        "\U0001F300-\U0001F5FF"   # Symbols & pictographs
-        "\U0001F680-\U0001F6FF"   # Transport & map symbols
-        "\U0001F700-\U0001F77F"   # Alchemical symbols
-        "\U0001F780-\U0001F7FF"   # Geometric shapes extended
-        "\U0001F800-\U0001F8FF"   # Supplemental arrows-C
-        "\U0001F900-\U0001F9FF"   # Supplemental symbols and pictographs
-        "\U0001FA00-\U0001FA6F"   # Chess symbols, etc.
-        "\U0001FA70-\U0001FAFF"   # Symbols and pictographs extended-A
-        "\U00002702-\U000027B0"   # Dingbats
-        "\U000024C2-\U0001F251"   # Enclosed characters
-        "]+", flags=re.UNICODE)
-
-    # Regex pattern for Discord custom emojis (static and animated)
-    discord_emoji_pattern = re.compile(r"<a?:\w+:\d+>")
-
-    # Remove all emojis from the text
-    text = re.sub(emoji_pattern, "", text)
-    text = re.sub(discord_emoji_pattern, "", text)
-
-    return text.strip()
+    # Plain ASCII without a '<' cannot contain either kind of emoji
+    if text.isascii() and "<" not in text:
+        return text.strip()
+    return _EMOJI_RE.sub("", text).strip()
 
 
 def test_internet() -> bool:
@@ -177,7 +278,8 @@ def test_internet() -> bool:
         bool: True if successful, otherwise False
     """
     try:
-        socket.create_connection(("www.google.com", 80), timeout=5)
+        with socket.create_connection(("www.google.com", 80), timeout=5):
+            pass
         log.debug("Internet connection test succeeded.")
         return True
     except OSError as e:
@@ -185,6 +287,25 @@ def test_internet() -> bool:
         return False
 
 
+async def test_internet_async() -> bool:
+    """
+    Async version of test_internet for use inside the event loop.
+
+    Returns:
+        bool: True if successful, otherwise False
+    """
+    try:
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection("www.google.com", 80), timeout=5)
+        writer.close()
+        await writer.wait_closed()
+        log.debug("Internet connection test succeeded.")
+        return True
+    except (OSError, asyncio.TimeoutError) as e:
+        log.error("Internet connection test failed: %s", e)
+        return False
+
+
 def is_channel_active(server_id: str, channel_id: str) -> bool:
     """
     Check if a channel is still active in the session data.
@@ -199,6 +320,27 @@ def is_channel_active(server_id: str, channel_id: str) -> bool:
     return channel_id in session_cache.get(server_id, {}).get("channels", {})
 
 
+@functools.lru_cache(maxsize=1024)
+def _clean_user_text(text: str, remove_user_emoji: bool, remove_patterns: tuple) -> str:
+    """
+    Applies an AI's user text settings: optional emoji removal, then each
+    remove_user_text_from pattern.
+
+    Args:
+        text: Message content
+        remove_user_emoji: Whether to strip emojis first
+        remove_patterns: Compiled patterns from compile_patterns
+
+    Returns:
+        str: Cleaned text
+    """
+    if remove_user_emoji:
+        text = remove_emoji(text)
+    for pattern in remove_patterns:
+        text = pattern.sub('', text).strip()
+    return text
+
+
 def capture_message(message_info, ai_name: str, reply_message=None) -> None:
     """
     Captures a message from a specified channel and stores it in the messages_cache.json file.
@@ -213,10 +355,8 @@ def capture_message(message_info, ai_name: str, reply_message=None) -> None:
     if getattr(message_info, "webhook_id", None):
         return
 
-    # Read existing cache data
-    dados = read_json("messages_cache.json")
-    if dados is None:
-        dados = {}
+    # Existing cache data, kept in memory between messages
+    dados = get_message_cache()
 
     # Extract server_id and channel_id from message_info
     server_id = str(message_info.guild.id)
@@ -239,60 +379,39 @@ def capture_message(message_info, ai_name: str, reply_message=None) -> None:
     if not channel_data or ai_name not in channel_data:
         return
     
-    session = channel_data[ai_name]
-
-    # Retrieve format templates from configuration
-    template_syntax = session["config"].get("user_format_syntax", "{message}")
-    reply_template_syntax = session["config"].get(
+    # Resolve the AI's formatting settings once for this message
+    ai_config = channel_data[ai_name]["config"]
+    template_syntax = ai_config.get("user_format_syntax", "{message}")
+    reply_template_syntax = ai_config.get(
         "user_reply_format_syntax", "{message}")
+    remove_user_emoji = ai_config["remove_user_emoji"]
+    remove_patterns = compile_patterns(ai_config.get("remove_user_text_from", []))
 
-    # Process message content and author name based on emoji removal configuration
-    if session["config"]["remove_user_emoji"]:
-        msg_text = remove_emoji(message_info.content)
-        msg_name = remove_emoji(
-            message_info.author.global_name or message_info.author.name)
-    else:
-        msg_text = message_info.content
-        msg_name = message_info.author.global_name or message_info.author.name
+    msg_name = message_info.author.global_name or message_info.author.name
 
     # Prepare data for formatting
     syntax = {
         "time": datetime.datetime.now().strftime("%H:%M"),
         "username": message_info.author.name,
-        "name": msg_name,
-        "message": msg_text,
+        "name": remove_emoji(msg_name) if remove_user_emoji else msg_name,
+        "message": _clean_user_text(message_info.content, remove_user_emoji, remove_patterns),
     }
 
-    # Remove unwanted text patterns from message content
-    for pattern in session["config"].get("remove_user_text_from", []):
-        syntax["message"] = re.sub(
-            pattern, '', syntax["message"], flags=re.MULTILINE).strip()
-
     # Process reply message if provided
     if reply_message:
-        if session["config"]["remove_user_emoji"]:
-            reply_text = remove_emoji(reply_message.content)
-            reply_name = remove_emoji(
-                reply_message.author.global_name or reply_message.author.name)
-        else:
-            reply_text = reply_message.content
-            reply_name = reply_message.author.global_name or reply_message.author.name
-
+        reply_name = reply_message.author.global_name or reply_message.author.name
         syntax.update({
             "reply_username": reply_message.author.name,
-            "reply_name": reply_name,
-            "reply_message": reply_text,
+            "reply_name": remove_emoji(reply_name) if remove_user_emoji else reply_name,
+            "reply_message": _clean_user_text(reply_message.content, remove_user_emoji, remove_patterns),
         })
-        for pattern in session["config"].get("remove_user_text_from", []):
-            syntax["reply_message"] = re.sub(
-                pattern, '', syntax["reply_message"], flags=re.MULTILINE).strip()
 
     # Group messages if the last one was from the same user
     try:
         ai_cache_data = dados[server_id][channel_id][ai_name]
 
-        if reply_message is None and msg_text not in [None, ""]:
-            formatted_message = template_syntax.format(**syntax)
+        if reply_message is None and syntax["message"]:
+            formatted_message = template_syntax.format_map(syntax)
 
             # Check if this exact message already exists in the cache
             message_already_exists = False
@@ -304,8 +423,7 @@ def capture_message(message_info, ai_name: str, reply_message=None) -> None:
                     break
 
             if not message_already_exists:
-                last_key = list(ai_cache_data.keys()
-                                )[-1] if ai_cache_data else None
+                last_key = next(reversed(ai_cache_data), None)
                 last_message = ai_cache_data.get(last_key, "")
 
                 # If the last message is from the same user (checked via message ending), group the message.
@@ -318,7 +436,7 @@ def capture_message(message_info, ai_name: str, reply_message=None) -> None:
                           ai_name, channel_id, formatted_message)
 
         elif reply_message is not None:
-            formatted_reply = reply_template_syntax.format(**syntax)
+            formatted_reply = reply_template_syntax.format_map(syntax)
             # Check if this reply already exists
             if "Reply" not in ai_cache_data or ai_cache_data["Reply"] != formatted_reply:
                 dados[server_id][channel_id][ai_name]["Reply"] = formatted_reply
@@ -329,7 +447,7 @@ def capture_message(message_info, ai_name: str, reply_message=None) -> None:
         log.error(
             "Error while saving message to cache for AI %s in channel %s: %s", ai_name, channel_id, e)
 
-    write_json("messages_cache.json", dados)
+    schedule_message_cache_flush()
 
 
 def format_to_send(cache_data: CacheData, server_id: str, channel_id: str, ai_name: str) -> str:
@@ -345,7 +463,6 @@ def format_to_send(cache_data: CacheData, server_id: str, channel_id: str, ai_na
     Returns:
         str: Combined messages from the specified AI
     """
-    formatted_messages = []
     try:
         server_data = cache_data.get(str(server_id))
         if not server_data:
@@ -364,15 +481,13 @@ def format_to_send(cache_data: CacheData, server_id: str, channel_id: str, ai_na
                 "No cache data found for AI: %s in channel %s in server %s", ai_name, channel_id, server_id)
             return ""
 
-        for key, text in ai_cache_data.items():
-            if isinstance(text, str):
-                formatted_messages.append(text)
+        combined_message = "\n".join(
+            text for text in ai_cache_data.values() if isinstance(text, str))
 
     except Exception as e:
         log.error("Error formatting cached messages for AI %s: %s", ai_name, e)
         return ""
 
-    combined_message = "\n".join(formatted_messages)
     log.debug("Formatted message to send for AI %s in server %s, channel %s: %s",
               ai_name, server_id, channel_id, combined_message[:100] + "..." if len(combined_message) > 100 else combined_message)
     return combined_message
@@ -390,6 +505,9 @@ def read_json(file_path: str) -> Optional[Dict[str, Any]]:
     """
     with session_lock:
         try:
+            if orjson is not None:
+                with open(file_path, 'rb') as file:
+                    return orjson.loads(file.read())
             with open(file_path, 'r', encoding="utf-8") as file:
                 return json.load(file)
         except FileNotFoundError:
@@ -407,72 +525,316 @@ def read_json(file_path: str) -> Optional[Dict[str, Any]]:
             return None
 
 
+def _encode_json(data: Dict[str, Any]) -> bytes:
+    """
+    Encodes data as UTF-8 JSON indented by two spaces, with orjson when it is installed.
+
+    orjson only supports two-space indentation, so the standard library path uses the
+    same indent; the files look the same whichever encoder wrote them.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def _write_json_payload(file_path: str, payload: bytes) -> None:
+    """
+    Writes an encoded document to a temporary file and moves it over file_path.
+
+    The write is skipped when the file still holds exactly what this process
+    last wrote there: same payload digest and same (mtime, size).
+    """
+    digest = hashlib.blake2b(payload, digest_size=8).digest()
+    with session_lock:
+        last = _write_hashes.get(file_path)
+        if last is not None and last[0] == digest and last[1] == _session_file_key(file_path):
+            return
+        tmp_path = f"{file_path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as file:
+                file.write(payload)
+            os.replace(tmp_path, file_path)
+            _write_hashes[file_path] = (digest, _session_file_key(file_path))
+        except Exception as e:
+            _write_hashes.pop(file_path, None)
+            log.error("Error saving JSON file '%s': %s", file_path, e)
+
+
 def write_json(file_path: str, data: Dict[str, Any]) -> None:
     """
     Writes the provided data to a JSON file.
 
+    The document is encoded in memory and written in one call to a temporary
+    file, which then replaces the target, so readers never see a partial file.
+
     Args:
         file_path: Path to the JSON file
         data: Data to write
     """
-    with session_lock:
-        try:
-            with open(file_path, 'w', encoding="utf-8") as file:
-                json.dump(data, file, ensure_ascii=False, indent=4)
-        except Exception as e:
-            log.error("Error saving JSON file '%s': %s", file_path, e)
+    try:
+        payload = _encode_json(data)
+    except Exception as e:
+        log.error("Error saving JSON file '%s': %s", file_path, e)
+        return
+    _write_json_payload(file_path, payload)
+
+
+async def read_json_async(file_path: str) -> Optional[Dict[str, Any]]:
+    """Runs read_json in a worker thread so disk I/O does not block the event loop."""
+    return await asyncio.to_thread(read_json, file_path)
+
+
+async def write_json_async(file_path: str, data: Dict[str, Any]) -> None:
+    """
+    Writes data like write_json, doing the file I/O in a worker thread.
+
+    The data is encoded before the call returns control to the event loop,
+    so later changes to shared dictionaries cannot race with the encoder.
+
+    Args:
+        file_path: Path to the JSON file
+        data: Data to write
+    """
+    try:
+        payload = _encode_json(data)
+    except Exception as e:
+        log.error("Error saving JSON file '%s': %s", file_path, e)
+        return
+    await asyncio.to_thread(_write_json_payload, file_path, payload)
+
+
+def get_message_cache(cache_file: str = "messages_cache.json") -> CacheData:
+    """
+    Returns the in-memory message cache, loading it from disk on first use.
+
+    The returned dictionary is shared; callers that change it must call
+    schedule_message_cache_flush so the change reaches the file.
+
+    Args:
+        cache_file: Path to the message cache file
+
+    Returns:
+        CacheData: Cached messages by server, channel and AI
+    """
+    if _cache_state["path"] != cache_file or _cache_state["data"] is None:
+        flush_message_cache()
+        _cache_state["data"] = read_json(cache_file) or {}
+        _cache_state["path"] = cache_file
+    return _cache_state["data"]
+
+
+def flush_message_cache() -> None:
+    """Writes the message cache to disk if it changed since the last write. Blocking."""
+    task = _cache_state["flush_task"]
+    if task is not None:
+        task.cancel()
+        _cache_state["flush_task"] = None
+    if _cache_state["dirty"]:
+        _cache_state["dirty"] = False
+        write_json(_cache_state["path"], _cache_state["data"])
+
+
+async def flush_message_cache_async() -> None:
+    """Writes the message cache to disk if it changed, without blocking the event loop."""
+    task = _cache_state["flush_task"]
+    if task is not None and task is not asyncio.current_task():
+        task.cancel()
+        _cache_state["flush_task"] = None
+    # Writes run one at a time so an older snapshot never replaces a newer one
+    async with _message_cache_write_lock:
+        if _cache_state["dirty"]:
+            _cache_state["dirty"] = False
+            await write_json_async(_cache_state["path"], _cache_state["data"])
+
+
+async def _flush_message_cache_later() -> None:
+    await asyncio.sleep(MESSAGE_CACHE_FLUSH_DELAY)
+    # Changes made while this write runs schedule a new one
+    _cache_state["flush_task"] = None
+    await flush_message_cache_async()
+
+
+def schedule_message_cache_flush() -> None:
+    """
+    Marks the message cache as changed and writes it after MESSAGE_CACHE_FLUSH_DELAY.
+
+    Changes made before the pending write runs are saved by that same write.
+    Outside of a running event loop the cache is written immediately.
+    """
+    _cache_state["dirty"] = True
+    if _cache_state["flush_task"] is not None:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        flush_message_cache()
+        return
+    _cache_state["flush_task"] = loop.create_task(_flush_message_cache_later())
+
+
+def _session_file_key(file_path: str) -> Optional[tuple]:
+    """Returns (mtime, size) for the file, or None if it cannot be stat'ed."""
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def get_session_snapshot(file_path: str = "session.json") -> Dict[str, Any]:
+    """
+    Returns the parsed contents of session.json, re-reading the file only when
+    its modification time or size changed since the last read or write.
+
+    The returned dictionary is owned by the session writer; callers that need
+    to modify it must work on a copy.
+
+    Args:
+        file_path: Path to the session file
+
+    Returns:
+        Dict[str, Any]: Session data from disk
+    """
+    key = _session_file_key(file_path)
+    if key is None or key != _session_snapshot["key"] or _session_snapshot["data"] is None:
+        _session_snapshot["data"] = read_json(file_path) or {}
+        _session_snapshot["key"] = _session_file_key(file_path)
+    return _session_snapshot["data"]
+
+
+def _store_session_snapshot(data: Dict[str, Any], file_path: str = "session.json") -> None:
+    """Writes session data to disk and remembers it as the current snapshot."""
+    write_json(file_path, data)
+    _session_snapshot["data"] = data
+    _session_snapshot["key"] = _session_file_key(file_path)
 
 
 async def load_session_cache() -> None:
     """Loads session data from session.json into memory cache"""
     global session_cache
-    session_cache = await asyncio.to_thread(read_json, "session.json") or {}
+    # Build the new cache entirely in the worker thread and publish it with a single
+    # assignment. It is mutated freely by handlers, so keep it apart from the snapshot.
+    new_cache = await asyncio.to_thread(lambda: copy.deepcopy(get_session_snapshot()))
+    session_cache = new_cache
     log.info(f"Loaded session cache with {len(session_cache)} servers")
 
 
+def get_session_cache_view() -> Mapping[str, Any]:
+    """
+    Returns a read-only, point-in-time view of the session cache.
+
+    Use it for loops that await between iterations: the server, channel and AI
+    mappings are copied, so AIs added or removed meanwhile do not break the loop.
+    The per-AI session dictionaries are still shared with the cache.
+
+    Returns:
+        Mapping[str, Any]: {server_id: {"channels": {channel_id: {ai_name: session}}}}
+    """
+    return MappingProxyType({
+        server_id: MappingProxyType({
+            "channels": MappingProxyType({
+                channel_id: MappingProxyType(dict(channel_data or {}))
+                for channel_id, channel_data in server_data.get("channels", {}).items()
+            })
+        })
+        for server_id, server_data in session_cache.items()
+    })
+
+
+def _apply_session_update(data: Dict[str, Any], server_id: str, channel_id: str,
+                          new_data: Optional[Dict[str, Any]]) -> None:
+    """
+    Applies one queued session update to a session dictionary in place.
+
+    Args:
+        data: Session dictionary (file contents or in-memory cache)
+        server_id: Server ID
+        channel_id: Channel ID
+        new_data: New channel data, or None to remove the channel
+    """
+    if server_id not in data:
+        data[server_id] = {"channels": {}}
+    if "channels" not in data[server_id]:
+        data[server_id]["channels"] = {}
+
+    if new_data is None:  # If new_data is None, it means we are removing the channel
+        data[server_id]["channels"].pop(channel_id, None)
+    else:
+        data[server_id]["channels"][channel_id] = new_data
+
+
+def _drain_session_updates() -> Dict[tuple, Optional[Dict[str, Any]]]:
+    """
+    Takes every update currently in the queue, keeping only the latest one per channel.
+
+    Returns:
+        Dict[tuple, Optional[Dict[str, Any]]]: Latest data keyed by (server_id, channel_id)
+    """
+    pending = {}
+    while True:
+        try:
+            server_id, channel_id, new_data = session_update_queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return pending
+        pending[(server_id, channel_id)] = new_data
+        session_update_queue.task_done()
+
+
+async def _write_session_updates(pending: Dict[tuple, Optional[Dict[str, Any]]]) -> None:
+    """
+    Persists a batch of coalesced session updates with a single write of session.json.
+    The file is only re-read if something else changed it since the last write.
+
+    Args:
+        pending: Latest data keyed by (server_id, channel_id)
+    """
+    session_data = await asyncio.to_thread(get_session_snapshot)
+    for (server_id, channel_id), new_data in pending.items():
+        # new_data is the live session_cache entry; the snapshot is encoded in a worker
+        # thread while handlers keep changing the cache, so it needs its own copy
+        _apply_session_update(session_data, server_id, channel_id, copy.deepcopy(new_data))
+    await asyncio.to_thread(_store_session_snapshot, session_data)
+
+    # Update in-memory cache
+    for (server_id, channel_id), new_data in pending.items():
+        _apply_session_update(session_cache, server_id, channel_id, new_data)
+
+
 async def process_session_updates() -> None:
-    """Background task to process session updates from the queue"""
+    """
+    Background task to process session updates from the queue.
+
+    Updates arriving within SESSION_FLUSH_INTERVAL of each other are coalesced,
+    so session.json is written once per batch instead of once per update.
+    """
     log.info("Starting session update processor")
     while True:
         try:
-            server_id, channel_id, new_data = await session_update_queue.get()
-            log.debug(
-                f"Processing session update for server {server_id}, channel {channel_id}")
-
-            session_data = await asyncio.to_thread(read_json, "session.json") or {}
-
-            if server_id not in session_data:
-                session_data[server_id] = {"channels": {}}
-            if "channels" not in session_data[server_id]:
-                session_data[server_id]["channels"] = {}
-
-            if new_data is None: # If new_data is None, it means we are removing the channel
-                if channel_id in session_data[server_id]["channels"]:
-                    del session_data[server_id]["channels"][channel_id]
-            else:
-                session_data[server_id]["channels"][channel_id] = new_data
-
-            await asyncio.to_thread(write_json, "session.json", session_data)
-
-            # Update in-memory cache
-            if server_id not in session_cache:
-                session_cache[server_id] = {"channels": {}}
-            if "channels" not in session_cache[server_id]:
-                session_cache[server_id]["channels"] = {}
-            
-            if new_data is None: # If new_data is None, it means we are removing the channel
-                if channel_id in session_cache[server_id]["channels"]:
-                    del session_cache[server_id]["channels"][channel_id]
-            else:
-                session_cache[server_id]["channels"][channel_id] = new_data
-
+            # Wait for the first update, then give related updates a moment to arrive
+            first = await session_update_queue.get()
             session_update_queue.task_done()
-            log.debug(
-                f"Completed session update for server {server_id}, channel {channel_id}")
+            pending = {(first[0], first[1]): first[2]}
+            try:
+                await asyncio.sleep(SESSION_FLUSH_INTERVAL)
+                pending.update(_drain_session_updates())
+                log.debug("Processing %d coalesced session update(s)", len(pending))
+                await _write_session_updates(pending)
+            except asyncio.CancelledError:
+                # Hand the batch back so flush_session_updates can still persist it
+                for (server_id, channel_id), new_data in pending.items():
+                    session_update_queue.put_nowait((server_id, channel_id, new_data))
+                raise
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             log.error(f"Error in process_session_updates: {e}")
-            # Ensure the queue item is marked as done even on error
-            session_update_queue.task_done()
+
+
+async def flush_session_updates() -> None:
+    """Writes any session updates still waiting in the queue. Used on shutdown."""
+    pending = _drain_session_updates()
+    if pending:
+        await _write_session_updates(pending)
 
 
 async def update_session_data(server_id: str, channel_id: str, new_data: Dict[str, Any]) -> None:
@@ -525,9 +887,18 @@ def get_ai_session_data_from_all_channels(server_id: str, ai_name: str) -> Optio
     server_data = session_cache.get(server_id, {})
     channels_data = server_data.get("channels", {})
 
+    # Fast path: the channel this AI was last found in, if it is still there
+    channel_id = _ai_channel_index.get((server_id, ai_name))
+    if channel_id is not None:
+        channel_ais = channels_data.get(channel_id)
+        if channel_ais and ai_name in channel_ais:
+            return channel_id, channel_ais[ai_name]
+
     for channel_id, channel_ais in channels_data.items():
         if ai_name in channel_ais:
+            _ai_channel_index[(server_id, ai_name)] = channel_id
             return channel_id, channel_ais[ai_name]
+    _ai_channel_index.pop((server_id, ai_name), None)
     return None
 
 
@@ -540,7 +911,7 @@ async def clear_message_cache(server_id: str, channel_id: str, ai_name: Optional
         channel_id: ID do canal
         ai_name: Opcional. O nome da IA para limpar o cache. Se None, limpa o cache de todas as IAs no canal.
     """
-    cache_data = await asyncio.to_thread(read_json, "messages_cache.json")
+    cache_data = get_message_cache()
     if cache_data and server_id in cache_data and channel_id in cache_data[server_id]:
         if ai_name:
             if ai_name in cache_data[server_id][channel_id]:
@@ -552,7 +923,7 @@ async def clear_message_cache(server_id: str, channel_id: str, ai_name: Optional
             del cache_data[server_id][channel_id]
             log.info(
                 f"Cleared message cache for all AIs in server {server_id}, channel {channel_id}")
-        await asyncio.to_thread(write_json, "messages_cache.json", cache_data)
+        schedule_message_cache_flush()
 
 
 async def remove_session_data(server_id: str, channel_id: str) -> None:
@@ -586,32 +957,9 @@ async def remove_sent_messages_from_cache(server_id: str, channel_id: str, ai_na
         channel_id: Channel ID
         ai_name: The name of the AI whose messages to clear
     """
-    cache_data = await asyncio.to_thread(read_json, "messages_cache.json")
+    cache_data = get_message_cache()
     if cache_data and server_id in cache_data and channel_id in cache_data[server_id] and ai_name in cache_data[server_id][channel_id]:
         cache_data[server_id][channel_id][ai_name] = {}
-        await asyncio.to_thread(write_json, "messages_cache.json", cache_data)
+        schedule_message_cache_flush()
         log.debug(
             f"Removed processed messages from cache for AI '{ai_name}' in server {server_id}, channel {channel_id}")
-
-
-async def remove_session_data(server_id: str, channel_id: str) -> None:
-    """
-    Remove os dados da sessão para um canal específico.
-
-    Args:
-        server_id: ID do servidor
-        channel_id: ID do canal
-    """
-    global session_cache
-    if server_id in session_cache and channel_id in session_cache[server_id].get("channels", {}):
-        # Remove from in-memory cache
-        del session_cache[server_id]["channels"][channel_id]
-        log.info(f"Removed session data for server {server_id}, channel {channel_id} from cache.")
-
-        # Update persistent storage by queuing a None value for the channel
-        await session_update_queue.put((server_id, channel_id, None))
-
-    # Limpa o cache de mensagens
-    await clear_message_cache(server_id, channel_id)
-
-
@@ -1,28 +1,54 @@
+import functools
+import hashlib
 import json
 import os
 import re
+import shutil
 import sys
 import time
-import zipfile
 import asyncio
 import subprocess
-from io import BytesIO
 from pathlib import Path
 from typing import Dict, Any
 
-import requests
-from colorama import Fore, init, Style
-from packaging import version
+import aiohttp
+from colorama import Fore, Style
 
 import utils.func as func
-from utils.config_updater import ConfigManager
+from utils.config_updater import ConfigManager, pack_semver, version_less_than
 
-if not os.path.exists("version.txt"):
-    with open("version.txt", "w") as file:
-        file.write("1.1.6\n")
+# Set by boot() when auto_update is enabled; the bot runs the check in the background
+auto_updater = None
+# Update found by the background check, installed after the bot shuts down
+pending_update = None
 
-# Initialize colorama for cross-platform colored output
-init(autoreset=True)
+# ETag of the latest release that needed no update, for conditional requests
+ETAG_FILE = ".github_etag"
+
+# Routine update checks are skipped if the last one found nothing less than this many seconds ago
+UPDATE_CHECK_INTERVAL = 6 * 3600
+# time.time() of the last routine update check that found nothing to install
+LAST_CHECK_FILE = ".last_update_check"
+
+# Bounds connecting and each read, so a stalled network can't hang the update; downloads may take longer overall
+UPDATE_HTTP_TIMEOUT = aiohttp.ClientTimeout(total=None, connect=10, sock_read=30)
+
+# Erase the terminal and move the cursor home
+CLEAR_SCREEN = "\x1b[2J\x1b[H"
+
+# GitHub repository URL: captures owner and name, without a trailing ".git" or "/"
+_REPO_RE = re.compile(
+    r"(?:git@github\.com:|https://github\.com/)([\w.-]+?)/([\w.-]+?)(?:\.git)?/?$")
+
+
+def _ensure_bootstrap_files():
+    """Creates version.txt on first run."""
+    # Exclusive mode makes this a single open that fails if the file exists
+    try:
+        with open("version.txt", "x") as file:
+            file.write("1.1.6\n")
+    except FileExistsError:
+        pass
 
 
 def sync_dict(current, default):
@@ -179,8 +205,7 @@ Now, send your message introducing yourself in the chat, following the language
                 f"No channels found for server: {server_id}. Skipping update for this server.")
 
     # Write the updated session data back to the JSON file
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(session_data, f, indent=4, ensure_ascii=False)
+    func.write_json(file_path, session_data)
 
     func.log.debug("Session file updated successfully.")
 
@@ -197,6 +222,8 @@ class AutoUpdater:
         """
         self.repo_url = repo_url
         self.current_version = current_version
+        self._current_tag = self._strip_tag_prefix(current_version)
+        self._current_packed = pack_semver(self._current_tag)
         self.branch = branch
         self.is_exe = is_exe if is_exe is not None else self.is_running_as_exe()
         self.repo_owner, self.repo_name = self._extract_repo_info(repo_url)
@@ -205,72 +232,140 @@ class AutoUpdater:
         self.exe_name = "Hashi.exe"
         self.exe_path = Path(sys.executable).resolve() if self.is_exe else None
         self.script_dir = Path(__file__).parent.resolve()
+        # HTTP session shared by the requests of one update run, see _get_http
+        self._http = None
+        # ETag of the last fetched release, saved once it is known not to need an update
+        self._latest_etag = None
 
-    def check_and_update(self, force=False):
+    async def check_and_update(self, force=False):
+        try:
+            update = await self.check_only(force=force)
+            if update is not None:
+                await self.apply(update)
+        finally:
+            await self.close()
+
+    def _get_http(self):
+        """
+        Returns the HTTP session for the current update run, creating it on first use.
+
+        The release lookup and the asset download then share keep-alive connections.
+        """
+        if self._http is None or self._http.closed:
+            self._http = aiohttp.ClientSession(headers=self.headers, timeout=UPDATE_HTTP_TIMEOUT)
+        return self._http
+
+    async def close(self):
+        """Closes the HTTP session of the current update run, if one was opened."""
+        if self._http is not None and not self._http.closed:
+            await self._http.close()
+        self._http = None
+
+    async def check_only(self, force=False):
+        """
+        Looks for an update without installing it.
+
+        :param force: Return an update even if the current version is the latest
+        :return: A descriptor to pass to apply(), or None if there is nothing to install
+        """
         if os.environ.get("SKIP_AUTOUPDATE") == "1":
             func.log.info(
                 "Skipping update check to avoid infinite restart loop.")
-            return
+            return None
 
         if self.is_exe:
             # NOTA: Forçar uma atualização para .exe é mais complexo, pois precisa da URL do recurso de lançamento.
             # A implementação atual fará o download novamente da versão mais recente, se forçada.
-            latest_release = self._get_latest_release()
-            is_new_version = latest_release and version.parse(latest_release['tag_name']) > version.parse(self.current_version)
+            latest_release = await self._get_latest_release(conditional=not force)
+            is_new_version = latest_release and self._is_newer(latest_release['tag_name'])
 
-            if force or is_new_version:
-                log_msg = "Forcing executable update..." if force else "New executable version detected. Updating..."
+            if latest_release and (force or is_new_version):
+                log_msg = "Forcing executable update..." if force else "New executable version detected."
                 func.log.info(log_msg)
-                self._update_exe(latest_release)
-            else:
-                func.log.info("No executable updates available.")
-        else:
-            if force:
-                func.log.info("Forcing source code update...")
-                try:
-                    if not (self.script_dir / '.git').exists():
-                        func.log.error("Cannot force update: Not a git repository.")
-                        return
-                    subprocess.run(['git', 'fetch', 'origin', self.branch],
-                                   check=True, cwd=self.script_dir, capture_output=True)
-                    if self._update_from_commit():
-                        func.log.info("Source update applied; restarting program.")
-                        self._restart_program()
-                except subprocess.CalledProcessError as e:
-                    func.log.error(f"Failed to fetch before forced update: {e.stderr.decode().strip() if e.stderr else e}")
-                return
-
-            update_available = self._is_source_update_available()
-            if update_available:
-                func.log.info("New source code version detected. Updating...")
-                if self._update_from_commit():
-                    func.log.info("Source update applied; restarting program.")
-                    self._restart_program()
-            else:
-                func.log.info("Source code is up to date.")
+                return "exe", latest_release
+            func.log.info("No executable updates available.")
+            if latest_release and self._latest_etag:
+                # Only remembered when there is nothing to install, so a failed update is retried
+                self._save_etag(self._latest_etag)
+            return None
+
+        # git runs in a worker thread so a background check does not stall the bot
+        if force:
+            func.log.info("Forcing source code update...")
+            if not (self.script_dir / '.git').exists():
+                func.log.error("Cannot force update: Not a git repository.")
+                return None
+            try:
+                await asyncio.to_thread(
+                    subprocess.run, ['git', 'fetch', 'origin', self.branch],
+                    check=True, cwd=self.script_dir, capture_output=True)
+            except subprocess.CalledProcessError as e:
+                func.log.error(f"Failed to fetch before forced update: {e.stderr.decode().strip() if e.stderr else e}")
+                return None
+            return "source", None
+
+        if await asyncio.to_thread(self._is_source_update_available):
+            func.log.info("New source code version detected.")
+            return "source", None
+        func.log.info("Source code is up to date.")
+        return None
+
+    async def apply(self, update):
+        """
+        Installs an update found by check_only() and restarts the program.
+
+        :param update: The descriptor returned by check_only()
+        :return: False if the update could not be installed; on success the program
+            restarts and this does not return
+        """
+        kind, release_data = update
+        if kind == "exe":
+            func.log.info("Updating executable...")
+            return await self._update_exe(release_data)
+        func.log.info("Updating source code...")
+        if not self._update_from_commit():
+            return False
+        func.log.info("Source update applied; restarting program.")
+        self._restart_program()
+        return False
 
     def _extract_repo_info(self, repo_url):
-        match = re.match(
-            r"(?:git@github\.com:|https://github\.com/)([\w-]+)/([\w-]+)(?:\.git)?", repo_url)
+        match = _REPO_RE.match(repo_url)
         if not match:
             raise ValueError("Invalid repository URL")
         return match.group(1), match.group(2)
 
-    def _get_latest_release(self):
+    async def _get_latest_release(self, conditional=True):
+        """
+        Fetches the latest release from the GitHub API.
+
+        :param conditional: Send the ETag of the last release that needed no update;
+            GitHub then answers 304 without a body if the release has not changed
+        :return: The release data, or None if it is unchanged or could not be fetched
+        """
+        headers = {}
+        if conditional:
+            try:
+                with open(ETAG_FILE, "r", encoding="utf-8") as f:
+                    headers["If-None-Match"] = f.read().strip()
+            except FileNotFoundError:
+                pass
         try:
-            response = requests.get(
-                f"{self.base_url}/releases/latest", headers=self.headers)
-            if response.status_code == 200:
-                return response.json()
-            else:
+            async with self._get_http().get(f"{self.base_url}/releases/latest", headers=headers) as response:
+                if response.status == 304:
+                    func.log.debug("Latest release unchanged since the last check")
+                    return None
+                if response.status == 200:
+                    self._latest_etag = response.headers.get("ETag")
+                    return await response.json()
                 func.log.error(
-                    "Failed to fetch latest release: Status code %s", response.status_code)
+                    "Failed to fetch latest release: Status code %s", response.status)
                 return None
         except Exception as e:
             func.log.error("Error fetching release: %s", e)
             return None
 
-    def _update_exe(self, release_data):
+    async def _update_exe(self, release_data):
         func.log.info("New update found, downloading...")
 
         new_version = release_data.get('tag_name', self.current_version)
@@ -284,48 +379,112 @@ class AutoUpdater:
                 func.log.info(
                     "Zip asset found for update, processing zip file...")
                 try:
-                    self._download_with_progress(
-                        asset['browser_download_url'], new_version, zip_mode=True)
+                    return await self._download_with_progress(
+                        asset['browser_download_url'], new_version, zip_mode=True,
+                        expected_size=asset.get('size'), expected_digest=asset.get('digest'))
                 except Exception as e:
                     func.log.error("Update via zip failed: %s", e)
-                return
+                return False
             else:
                 func.log.error(
                     "No suitable asset found for update (neither .exe nor .zip)")
-                return
+                return False
         try:
-            self._download_with_progress(
-                asset['browser_download_url'], new_version)
+            return await self._download_with_progress(
+                asset['browser_download_url'], new_version,
+                expected_size=asset.get('size'), expected_digest=asset.get('digest'))
         except Exception as e:
             func.log.error("Executable update failed: %s", e)
+            return False
 
-    def _download_with_progress(self, url, new_version, zip_mode=False):
-        response = requests.get(url, stream=True)
-        total_size = int(response.headers.get('content-length', 0))
+    async def _download_with_progress(self, url, new_version, zip_mode=False,
+                                      expected_size=None, expected_digest=None):
         downloaded_size = 0
         temp_exe = self.exe_path.parent / "Hashi_new.exe"
+        # Zip assets are streamed to their own file first, then the executable is extracted from it
+        download_path = self.exe_path.parent / "Hashi_update.zip" if zip_mode else temp_exe
 
-        try:
-            with open(temp_exe, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
+        async with self._get_http().get(url) as response:
+            response.raise_for_status()
+            total_size = response.content_length or 0
+            try:
+                with open(download_path, "wb") as f:
+                    async for chunk in response.content.iter_chunked(1 << 16):
                         f.write(chunk)
                         downloaded_size += len(chunk)
-                        percent = (downloaded_size / total_size) * 100
-                        print(f"Download progress: {percent:.2f}%", end="\r")
-        except Exception as e:
-            func.log.error("Failed to write new executable: %s", e)
-            return
+                        if total_size:
+                            percent = (downloaded_size / total_size) * 100
+                            print(f"Download progress: {percent:.2f}%", end="\r")
+            except Exception as e:
+                func.log.error("Failed to write new executable: %s", e)
+                return False
+
+        # A short download is caught by its size without hashing it
+        if expected_size and downloaded_size != expected_size:
+            func.log.error("Downloaded update is incomplete (%s of %s bytes), aborting update",
+                           downloaded_size, expected_size)
+            download_path.unlink(missing_ok=True)
+            return False
+
+        if not await asyncio.to_thread(self._verify_digest, download_path, expected_digest):
+            download_path.unlink(missing_ok=True)
+            return False
+
+        if zip_mode:
+            try:
+                self._extract_exe_from_zip(download_path, temp_exe)
+            except Exception as e:
+                func.log.error("Failed to extract executable from zip: %s", e)
+                return False
+            finally:
+                download_path.unlink(missing_ok=True)
+
+        return self._apply_update(temp_exe, new_version)
+
+    @staticmethod
+    def _verify_digest(path, expected_digest):
+        """
+        Checks a downloaded file against the "sha256:<hex>" digest GitHub reports for release assets.
+
+        Returns True when the digest matches or the release does not provide one.
+        """
+        if not expected_digest:
+            func.log.debug("Release asset has no digest, skipping integrity check")
+            return True
+        algorithm, _, expected = expected_digest.partition(":")
+        if algorithm != "sha256" or not expected:
+            func.log.warning("Unsupported asset digest '%s', skipping integrity check", expected_digest)
+            return True
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 16), b""):
+                digest.update(block)
+        if digest.hexdigest() != expected.lower():
+            func.log.error("Downloaded update is corrupted (SHA-256 mismatch), aborting update")
+            return False
+        return True
 
-        if not zip_mode:
-            self._apply_update(temp_exe, new_version)
+    @staticmethod
+    def _extract_exe_from_zip(zip_path, target_path):
+        """Extracts the first .exe member of the archive to target_path without loading the archive into memory."""
+        # Only zip releases need this, so don't pay for importing it on every start
+        import zipfile
+
+        with zipfile.ZipFile(zip_path) as zip_file:
+            member = next((name for name in zip_file.namelist() if name.lower().endswith('.exe')), None)
+            if member is None:
+                raise FileNotFoundError("No executable found in the zip archive")
+            with zip_file.open(member) as src, open(target_path, "wb") as dst:
+                shutil.copyfileobj(src, dst, 1 << 16)
 
     def _apply_update(self, temp_exe, new_version):
         func.log.info("Switching to the latest executable file...")
         version_file = self.exe_path.parent / "version.txt"
+        pid = os.getpid()
+        # Wait until this process has exited (releasing the exe), then let move /Y replace it
         update_script = f"""@echo off
-timeout /t 3 /nobreak >nul
-del "{self.exe_path}"
+:wait
+tasklist /FI "PID eq {pid}" | find "{pid}" >nul && (timeout /t 1 /nobreak >nul & goto wait)
 move /Y "{temp_exe}" "{self.exe_path}"
 echo {new_version} > "{version_file}"
 start "" "{self.exe_path}"
@@ -339,6 +498,7 @@ exit
             sys.exit(0)
         except Exception as e:
             func.log.error("Failed to execute update script: %s", e)
+            return False
 
     def _is_source_update_available(self):
         try:
@@ -349,15 +509,10 @@ exit
             subprocess.run(['git', 'fetch', 'origin', self.branch],
                            check=True, cwd=self.script_dir, capture_output=True)
 
-            # Get the local commit hash
-            local_hash_proc = subprocess.run(
-                ['git', 'rev-parse', 'HEAD'], check=True, cwd=self.script_dir, capture_output=True, text=True)
-            local_hash = local_hash_proc.stdout.strip()
-
-            # Get the remote commit hash
-            remote_hash_proc = subprocess.run(
-                ['git', 'rev-parse', f'origin/{self.branch}'], check=True, cwd=self.script_dir, capture_output=True, text=True)
-            remote_hash = remote_hash_proc.stdout.strip()
+            # Resolve the local and remote commit hashes with a single git process
+            rev_parse_proc = subprocess.run(
+                ['git', 'rev-parse', 'HEAD', f'origin/{self.branch}'], check=True, cwd=self.script_dir, capture_output=True, text=True)
+            local_hash, remote_hash = rev_parse_proc.stdout.split()
 
             # Compare hashes
             if local_hash != remote_hash:
@@ -392,19 +547,46 @@ exit
             [sys.executable] + sys.argv, env=new_env)
         sys.exit(0)
 
+    @staticmethod
+    def _save_etag(etag):
+        try:
+            with open(ETAG_FILE, "w", encoding="utf-8") as f:
+                f.write(etag)
+        except OSError as e:
+            func.log.debug("Could not save release ETag: %s", e)
+
+    def _is_newer(self, tag):
+        """Returns True if the release tag is a newer version than the one running."""
+        tag = self._strip_tag_prefix(tag)
+        # The release usually matches the running version, which needs no parsing
+        if tag == self._current_tag:
+            return False
+        packed = pack_semver(tag)
+        if packed is not None and self._current_packed is not None:
+            return packed > self._current_packed
+        return version_less_than(self._current_tag, tag)
+
+    @staticmethod
+    def _strip_tag_prefix(tag):
+        """Drops the leading "v" of release tags such as "v1.2.0"."""
+        return tag[1:] if tag[:1] in ("v", "V") else tag
+
     @staticmethod
     def is_running_as_exe():
         return getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS')
 
 
+@functools.lru_cache(maxsize=1)
 def return_version():
+    # version.txt only changes through an update, which restarts the process
     with open("version.txt", 'r') as file:
         version = file.read().strip()
     return version
 
 
 def startup_screen():
-    os.system("cls" if os.name == "nt" else "clear")
+    # Clear the screen with ANSI codes (translated by colorama on Windows) instead of spawning a shell
+    print(CLEAR_SCREEN, end="")
     banner = f"""{Style.BRIGHT}{Fore.WHITE}✦・ﾟ* Hashi 橋 - C.AI to Discord ﾟ・✦
 {Fore.YELLOW}▶ {Fore.WHITE}Description: {Fore.WHITE}An AI-powered Discord bot using Character.AI!
 {Fore.YELLOW}▶ {Fore.WHITE}Creator: {Fore.WHITE}LixxRarin
@@ -413,10 +595,11 @@ def startup_screen():
 {Style.RESET_ALL}
 """
     print(banner)
-    time.sleep(2)
 
 
 async def boot():
+    global auto_updater
+    _ensure_bootstrap_files()
     startup_screen()
     update_session_file()
 
@@ -433,8 +616,91 @@ async def boot():
         current_version=return_version(),
         branch=func.config_yaml["Options"].get("repo_branch", "main")
     )
-    # Executa a atualização se auto_update estiver ativado ou se for forçado
-    if func.config_yaml["Options"].get("auto_update", False) or force_update:
-        updater.check_and_update(force=force_update)
+    if force_update:
+        # A forced update was asked for explicitly, so install it before the bot starts
+        await updater.check_and_update(force=True)
+    elif func.config_yaml["Options"].get("auto_update", False):
+        # Routine checks run alongside the gateway connect, see check_for_updates_in_background
+        auto_updater = updater
+
 
-asyncio.run(boot())
+def _checked_recently():
+    """Returns True if a routine update check found nothing within UPDATE_CHECK_INTERVAL."""
+    try:
+        with open(LAST_CHECK_FILE, "r", encoding="utf-8") as f:
+            last_check = float(f.read().strip())
+    except (OSError, ValueError):
+        return False
+    return 0 <= time.time() - last_check < UPDATE_CHECK_INTERVAL
+
+
+def _record_update_check():
+    try:
+        with open(LAST_CHECK_FILE, "w", encoding="utf-8") as f:
+            f.write(str(time.time()))
+    except OSError as e:
+        func.log.debug("Could not record update check time: %s", e)
+
+
+async def check_for_updates_in_background(bot):
+    """
+    Checks for an update while the bot is running. If one is found, the bot is
+    closed so apply_pending_update() can install it once it has shut down.
+    """
+    global pending_update
+    if auto_updater is None:
+        return
+    if _checked_recently():
+        func.log.info("Skipping update check, the last one was less than %d hours ago.",
+                      UPDATE_CHECK_INTERVAL // 3600)
+        return
+    try:
+        update = await auto_updater.check_only()
+    except Exception as e:
+        func.log.error("Background update check failed: %s", e)
+        return
+    finally:
+        # The update is installed from a different event loop, so its session can't be reused
+        await auto_updater.close()
+    if update is None:
+        _record_update_check()
+        return
+    func.log.info("Update found, shutting down to install it...")
+    pending_update = update
+    await bot.close()
+
+
+def apply_pending_update():
+    """
+    Installs the update found by check_for_updates_in_background and restarts the program.
+
+    If the update cannot be installed, the check is recorded so the next start does not
+    find and fail on it again right away, and the bot is started again without it.
+    Returns False only if that restart also failed.
+    """
+    async def _apply():
+        try:
+            return await auto_updater.apply(pending_update)
+        finally:
+            await auto_updater.close()
+
+    try:
+        installed = asyncio.run(_apply())
+    except Exception as e:
+        func.log.error("Update failed: %s", e)
+        installed = False
+    if installed:
+        return True
+
+    func.log.error("The update could not be installed; restarting the bot on the current version.")
+    _record_update_check()
+    try:
+        # SKIP_AUTOUPDATE keeps the restarted bot from retrying the update immediately
+        auto_updater._restart_program()
+    except Exception as e:
+        func.log.critical("Failed to restart the bot: %s", e)
+    return False
+
+
+if __name__ == "__main__":
+    asyncio.run(boot())